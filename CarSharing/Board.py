@@ -0,0 +1,105 @@
+"""
+    Shared memory board with the best solution found by any worker, so workers can learn from each other while they run,
+    and the main process can read the best solution directly at the deadline.
+
+    Layout of the shared memory block:
+        int64[3]    header: version (0 = empty, +1 per publish), cost, worker that published it
+        int32[n]    assignment: request index -> car index (-1 = unassigned), see Model
+        int32[m]    placement: car index -> zone index (-1 = unassigned)
+"""
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from CarSharing.Model import Model
+from CarSharing.Solution import Solution
+
+HEADER = 3
+
+
+class Board:
+    def __init__(self, shm: shared_memory.SharedMemory, lock, n: int, m: int):
+        self.shm = shm
+        self.lock = lock
+        self.n = n
+        self.m = m
+        self.header = np.ndarray((HEADER,), dtype=np.int64, buffer=shm.buf)
+        self.assignment = np.ndarray((n,), dtype=np.int32, buffer=shm.buf, offset=HEADER * 8)
+        self.placement = np.ndarray((m,), dtype=np.int32, buffer=shm.buf, offset=HEADER * 8 + n * 4)
+
+    def __repr__(self):
+        return 'Board<version: {}, cost: {}, worker: {}>'.format(*self.header)
+
+    def __getstate__(self):
+        # Only pass the name, the other side attaches to the same block.
+        return self.shm.name, self.lock, self.n, self.m
+
+    def __setstate__(self, state):
+        name, lock, n, m = state
+        self.__init__(shared_memory.SharedMemory(name=name), lock, n, m)
+
+    @property
+    def version(self) -> int:
+        """ Changes every time a new best is published. Cheap, no locking. """
+        return int(self.header[0])
+
+    @property
+    def cost(self) -> Optional[int]:
+        """ Cost of the best solution on the board, None if empty. Cheap, no locking. """
+        return int(self.header[1]) if self.header[0] else None
+
+    def publish(self, cost: int, assignment: np.ndarray, placement: np.ndarray, worker: int) -> bool:
+        """
+        Put an encoded solution on the board, if it's better than what's already there.
+        :return: bool: Has the board changed?
+        """
+        # Quick check without the lock, most of the time someone else is already better.
+        if self.header[0] and cost >= self.header[1]:
+            return False
+        with self.lock:
+            if self.header[0] and cost >= self.header[1]:
+                return False
+            self.assignment[:] = assignment
+            self.placement[:] = placement
+            self.header[1] = cost
+            self.header[2] = worker
+            self.header[0] += 1
+        return True
+
+    def read(self) -> Optional[Tuple[int, int, np.ndarray, np.ndarray]]:
+        """
+        :return: (version, cost, assignment, placement) copies of the best solution, or None if the board is empty.
+        """
+        with self.lock:
+            if not self.header[0]:
+                return None
+            return int(self.header[0]), int(self.header[1]), self.assignment.copy(), self.placement.copy()
+
+    def load(self, problem) -> Optional[Solution]:
+        """
+        :return: The best solution on the board as a full Solution for this problem, or None if the board is empty.
+        """
+        best = self.read()
+        if best is None:
+            return None
+        version, cost, assignment, placement = best
+        return Solution.decode(problem, assignment, placement)
+
+    def close(self):
+        # The numpy views must be gone before the memory can be closed.
+        del self.header, self.assignment, self.placement
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    @classmethod
+    def create(cls, model: Model) -> 'Board':
+        n = len(model.req_zone)
+        m = len(model.car_ids)
+        shm = shared_memory.SharedMemory(create=True, size=HEADER * 8 + (n + m) * 4)
+        board = cls(shm, mp.Lock(), n, m)
+        board.header[:] = 0
+        return board
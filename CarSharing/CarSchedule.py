@@ -0,0 +1,82 @@
+from bisect import bisect_left
+from typing import List
+
+from CarSharing.Overlap import Overlap
+from CarSharing.Request import Request
+
+
+class CarSchedule:
+    """
+    The requests assigned to a single car, sorted by real_start.
+
+    Requests on the same car never overlap, so the intervals are disjoint and sorted by both start and end.
+    That means a new request can only overlap with the requests directly before and after it in time,
+    which turns "does this request fit on this car" into a binary search and two lookups.
+    """
+    __slots__ = ('starts', 'requests')
+
+    def __init__(self, starts: List[int] = None, requests: List[Request] = None):
+        self.starts: List[int] = [] if starts is None else starts
+        self.requests: List[Request] = [] if requests is None else requests
+
+    def __repr__(self):
+        return 'CarSchedule<{!r}>'.format([req.id for req in self.requests])
+
+    def __len__(self):
+        return len(self.requests)
+
+    def __iter__(self):
+        return iter(self.requests)
+
+    def copy(self):
+        return CarSchedule(self.starts.copy(), self.requests.copy())
+
+    def add(self, request: Request):
+        i = bisect_left(self.starts, request.real_start)
+        self.starts.insert(i, request.real_start)
+        self.requests.insert(i, request)
+
+    def remove(self, request: Request):
+        # Two requests with the same start always overlap, so the start identifies the request on this car.
+        i = bisect_left(self.starts, request.real_start)
+        del self.starts[i]
+        del self.requests[i]
+
+    def overlaps(self, request: Request, overlap: Overlap) -> bool:
+        """
+        Returns True if the request overlaps with any request already on this car.
+        :param overlap: The overlap relation of the problem, which decides what counts as overlap.
+        """
+        i = bisect_left(self.starts, request.real_start)
+        # First request that starts at the same time or later
+        if i < len(self.requests) and overlap.overlaps(request.index, self.requests[i].index):
+            return True
+        # Last request that starts before
+        if i > 0 and overlap.overlaps(request.index, self.requests[i - 1].index):
+            return True
+        return False
+
+
+def best_subset(requests: List[Request], weights: List[int]) -> List[Request]:
+    """
+    Weighted interval scheduling: the requests without overlap between them with the highest total weight, O(n log n).
+    Like the overlap relation of the problem, a request overlaps with any other request that starts before (or when) it ends.
+    """
+    order = sorted(range(len(requests)), key=lambda i: requests[i].real_end)
+    ends = [requests[i].real_end for i in order]
+    # previous[k]: amount of requests (in order) that end before request k starts, so fit before it
+    previous = [bisect_left(ends, requests[i].real_start, 0, k) for k, i in enumerate(order)]
+    # best[k]: highest total weight with only the first k requests (in order)
+    best = [0] * (len(order) + 1)
+    for k, i in enumerate(order):
+        best[k + 1] = max(best[k], weights[i] + best[previous[k]])
+
+    chosen = []
+    k = len(order)
+    while k > 0:
+        if best[k] > best[k - 1]:
+            chosen.append(requests[order[k - 1]])
+            k = previous[k - 1]
+        else:
+            k -= 1
+    return chosen
@@ -0,0 +1,256 @@
+"""
+    Metrics of the annealing: counters, latency histograms and an event log, per worker.
+
+    Cheap enough to always be on: nothing is done per iteration. The loop only reports once per temperature step
+    (iterations & accepted moves are taken from the counters that already exist), new bests are rate limited, and the
+    timed functions (see timed) are the big ones: greedy_assign, priority_assign, calculate_cost & copy.
+
+    If a path is given, every event is written to that file as a JSON line:
+        run     A new run (restart) starts
+        step    End of a temperature step: temperature, iterations, acceptance rate, iterations per second
+        best    New best cost, at most once per BEST_INTERVAL seconds (and at the end of every step)
+        end     End of a run: final cost, iterations, statistics of the operators (see Operators)
+        summary Totals for the worker, see summary()
+    Times ('t') are in seconds since the start of the program, so the files of all workers line up.
+"""
+import functools
+import json
+import time
+from typing import Dict, List, Optional
+
+# Minimum seconds between 2 'best' events
+BEST_INTERVAL = 0.1
+
+
+class Histogram:
+    """
+    Latencies in power of 2 buckets of µs: bucket k has everything in [2^(k-1), 2^k) µs.
+    """
+    __slots__ = ('count', 'total', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * 32
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        self.buckets[min(int(elapsed * 1e6).bit_length(), 31)] += 1
+
+    def merge(self, other: 'Histogram'):
+        self.count += other.count
+        self.total += other.total
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def percentile(self, p: float) -> float:
+        """ Upper bound of the bucket with the p-th percentile, in µs. """
+        seen = 0
+        for k, n in enumerate(self.buckets):
+            seen += n
+            if seen >= p * self.count:
+                return float(2 ** k)
+        return 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean_us': 1e6 * self.total / self.count if self.count else 0.0,
+            'p50_us': self.percentile(0.5),
+            'p99_us': self.percentile(0.99),
+            'buckets': self.buckets,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Histogram':
+        histogram = cls()
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.buckets = list(data['buckets'])
+        return histogram
+
+
+class Metrics:
+    def __init__(self, i: int, start: float = None, path: str = None):
+        """
+        :param i: worker number
+        :param start: time.monotonic() value of the start of the program, default now
+        :param path: File to write the events to, if any. Only opened at the first event, so this can be passed to a
+                     worker process before that.
+        """
+        self.i = i
+        self.start = time.monotonic() if start is None else start
+        self.path = path
+        self.file = None
+
+        self.counters: Dict[str, int] = {'runs': 0, 'iterations': 0, 'accepted': 0, 'steps': 0}
+        self.timers: Dict[str, Histogram] = {}
+        # Seconds spent in runs
+        self.runtime = 0.0
+        self.best_cost: Optional[int] = None
+        self.best_time: Optional[float] = None
+
+        # State of the current run
+        self.run_start = None
+        self.step_start = None
+        self.step_iterations = 0
+        self.step_accepted = 0
+        self.best_written = None
+        self.best_pending = False
+
+    def __repr__(self):
+        return 'Metrics<{}, {}>'.format(self.i, self.counters)
+
+    def now(self) -> float:
+        return time.monotonic() - self.start
+
+    def event(self, event: str, **data):
+        if self.path is not None:
+            if self.file is None:
+                self.file = open(self.path, 'w')
+            data['event'] = event
+            data['worker'] = self.i
+            data['run'] = self.counters['runs']
+            print(json.dumps(data), file=self.file)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def time(self, name: str, elapsed: float):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Histogram()
+        timer.add(elapsed)
+
+    def run_started(self, accepted: int = 0):
+        """
+        :param accepted: accepted moves so far, the counts passed to step are relative to this
+        """
+        self.count('runs')
+        self.run_start = self.step_start = time.monotonic()
+        self.step_iterations = 0
+        self.step_accepted = accepted
+        self.event('run', t=self.now())
+
+    def step(self, temp: float, iterations: int, accepted: int):
+        """
+        End of a temperature step.
+        :param iterations: iterations so far in this run
+        :param accepted: accepted moves so far in this run
+        """
+        now = time.monotonic()
+        n = iterations - self.step_iterations
+        a = accepted - self.step_accepted
+        elapsed = now - self.step_start
+        self.count('steps')
+        self.count('iterations', n)
+        self.count('accepted', a)
+        self.flush_best()
+        self.event('step', t=now - self.start, temp=temp, iterations=n, acceptance=a / n if n else 0.0,
+                   rate=n / elapsed if elapsed > 0 else 0.0)
+        self.step_start = now
+        self.step_iterations = iterations
+        self.step_accepted = accepted
+
+    def best(self, cost: int):
+        """
+        New best cost of a run, only counts if it's the best of this worker.
+        Only written if the last one was long enough ago, otherwise it's written later by flush_best.
+        """
+        if self.best_cost is not None and cost >= self.best_cost:
+            return
+        self.best_cost = cost
+        self.best_time = self.now()
+        if self.best_written is None or self.best_time - self.best_written >= BEST_INTERVAL:
+            self.best_written = self.best_time
+            self.best_pending = False
+            self.event('best', t=self.best_time, cost=cost)
+        else:
+            self.best_pending = True
+
+    def flush_best(self):
+        if self.best_pending:
+            self.best_pending = False
+            self.best_written = self.best_time
+            self.event('best', t=self.best_time, cost=self.best_cost)
+
+    def run_finished(self, temp: float, iterations: int, accepted: int, cost: int, aborted: bool, operators: List[dict]):
+        """
+        End of a run, also counts the last (partial) temperature step.
+        """
+        if iterations > self.step_iterations:
+            self.step(temp, iterations, accepted)
+        self.flush_best()
+        self.runtime += time.monotonic() - self.run_start
+        self.event('end', t=self.now(), cost=cost, iterations=iterations, aborted=aborted, operators=operators)
+
+    def summary(self) -> dict:
+        return {
+            'worker': self.i,
+            'counters': self.counters,
+            'runtime': self.runtime,
+            'iterations_per_second': self.counters['iterations'] / self.runtime if self.runtime > 0 else 0.0,
+            'acceptance': self.counters['accepted'] / self.counters['iterations'] if self.counters['iterations'] else 0.0,
+            'restarts': max(0, self.counters['runs'] - 1),
+            'best_cost': self.best_cost,
+            'best_time': self.best_time,
+            'timers': {name: timer.to_dict() for name, timer in self.timers.items()},
+        }
+
+    def close(self) -> dict:
+        """
+        Write the summary and close the file.
+        :return: The summary
+        """
+        summary = self.summary()
+        self.event('summary', **summary)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return summary
+
+
+def merge(summaries: List[dict]) -> dict:
+    """
+    Merged summary of all workers: totals of the counters & timers, the worker summaries are kept as is.
+    """
+    counters = {}
+    timers = {}
+    for summary in summaries:
+        for name, n in summary['counters'].items():
+            counters[name] = counters.get(name, 0) + n
+        for name, data in summary['timers'].items():
+            timers.setdefault(name, Histogram()).merge(Histogram.from_dict(data))
+    bests = [summary for summary in summaries if summary['best_cost'] is not None]
+    best = min(bests, key=lambda x: x['best_cost'], default=None)
+    runtime = sum(summary['runtime'] for summary in summaries)
+    return {
+        'workers': len(summaries),
+        'counters': counters,
+        'runtime': runtime,
+        'iterations_per_second': counters.get('iterations', 0) / runtime if runtime > 0 else 0.0,
+        'acceptance': counters.get('accepted', 0) / counters['iterations'] if counters.get('iterations') else 0.0,
+        'restarts': {summary['worker']: summary['restarts'] for summary in summaries},
+        'best_cost': None if best is None else best['best_cost'],
+        'best_worker': None if best is None else best['worker'],
+        'best_time': None if best is None else best['best_time'],
+        'timers': {name: timer.to_dict() for name, timer in timers.items()},
+        'per_worker': summaries,
+    }
+
+
+def timed(name: str):
+    """
+    Decorator for Solution methods: the time spent in it goes in the metrics of the problem.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self.problem.metrics.time(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
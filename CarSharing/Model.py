@@ -0,0 +1,112 @@
+from typing import List, Dict
+
+import numpy as np
+
+from CarSharing.Request import Request
+from CarSharing.Zone import Zone
+
+
+class Model:
+    """
+    Integer indexed, array backed view of a problem instance.
+
+    Requests, zones and cars are dense ints: their index in the requests, zones and vehicles lists.
+    A solution is then just 2 int arrays: request -> car and car -> zone, with -1 for unassigned.
+    """
+    req_ids: List[str]
+    car_ids: List[str]
+    car_index: Dict[str, int]
+    zone_ids: List[str]
+
+    # np {(int, int) -> bool}: adjacency[a, b] is True if zone b is a neighbour of zone a.
+    adjacency: np.ndarray
+
+    # np {int -> int}: Per request, indexed by Request.index.
+    req_zone: np.ndarray
+    req_day: np.ndarray
+    req_start: np.ndarray  # real_start
+    req_end: np.ndarray  # real_end
+    penalty1: np.ndarray
+    penalty2: np.ndarray
+
+    # CSR table of compatible vehicles: The cars of request i are vehicles[vehicles_indptr[i]:vehicles_indptr[i + 1]].
+    vehicles_indptr: np.ndarray
+    vehicles: np.ndarray
+    # The same table transposed: The requests car c can serve are car_requests[car_requests_indptr[c]:car_requests_indptr[c + 1]].
+    car_requests_indptr: np.ndarray
+    car_requests: np.ndarray
+
+    def __init__(self, req_ids, car_ids, zone_ids, adjacency, req_zone, req_day, req_start, req_end, penalty1, penalty2, vehicles_indptr, vehicles):
+        self.req_ids = req_ids
+        self.car_ids = car_ids
+        self.car_index = {car: i for i, car in enumerate(car_ids)}
+        self.zone_ids = zone_ids
+        self.adjacency = adjacency
+        self.req_zone = req_zone
+        self.req_day = req_day
+        self.req_start = req_start
+        self.req_end = req_end
+        self.penalty1 = penalty1
+        self.penalty2 = penalty2
+        self.vehicles_indptr = vehicles_indptr
+        self.vehicles = vehicles
+        # Derived here instead of stored (in the cache), it's cheap compared to the overlap.
+        rows = np.repeat(np.arange(len(req_zone), dtype=np.int32), np.diff(vehicles_indptr))
+        self.car_requests = rows[np.argsort(vehicles, kind='stable')]
+        self.car_requests_indptr = np.zeros(len(car_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(vehicles, minlength=len(car_ids)), out=self.car_requests_indptr[1:])
+
+    def __repr__(self):
+        return 'Model<requests: {}, zones: {}, cars: {}>'.format(len(self.req_zone), len(self.zone_ids), len(self.car_ids))
+
+    def request_vehicles(self, i: int) -> np.ndarray:
+        return self.vehicles[self.vehicles_indptr[i]:self.vehicles_indptr[i + 1]]
+
+    def car_requests_of(self, c: int) -> np.ndarray:
+        return self.car_requests[self.car_requests_indptr[c]:self.car_requests_indptr[c + 1]]
+
+    def empty_assignment(self) -> np.ndarray:
+        return np.full(len(self.req_zone), -1, dtype=np.int32)
+
+    def empty_placement(self) -> np.ndarray:
+        return np.full(len(self.car_ids), -1, dtype=np.int32)
+
+    def cost(self, assignment: np.ndarray, placement: np.ndarray) -> int:
+        """
+        Vectorized cost of an encoded solution. Does not check feasibility.
+        """
+        assigned = assignment >= 0
+        zones = placement[assignment[assigned]]
+        neighbour = self.adjacency[zones, self.req_zone[assigned]]
+        return int(self.penalty2[assigned][neighbour].sum() + self.penalty1[~assigned].sum())
+
+    @classmethod
+    def from_objects(cls, requests: List[Request], zones: List[Zone], vehicles: List[str]):
+        zone_index = {zone.id: zone.index for zone in zones}
+        car_index = {car: i for i, car in enumerate(vehicles)}
+
+        adjacency = np.zeros((len(zones), len(zones)), dtype=bool)
+        for zone in zones:
+            adjacency[zone.index, [zone_index[z] for z in zone.neighbour_ids if z in zone_index]] = True
+
+        counts = np.fromiter((len(r.vehicles) for r in requests), dtype=np.int64, count=len(requests))
+        vehicles_indptr = np.zeros(len(requests) + 1, dtype=np.int64)
+        np.cumsum(counts, out=vehicles_indptr[1:])
+
+        def column(values):
+            return np.fromiter(values, dtype=np.int64, count=len(requests))
+
+        return cls(
+            req_ids=[r.id for r in requests],
+            car_ids=list(vehicles),
+            zone_ids=[zone.id for zone in zones],
+            adjacency=adjacency,
+            req_zone=column(r.zone.index for r in requests),
+            req_day=column(r.day for r in requests),
+            req_start=column(r.real_start for r in requests),
+            req_end=column(r.real_end for r in requests),
+            penalty1=column(r.penalty1 for r in requests),
+            penalty2=column(r.penalty2 for r in requests),
+            vehicles_indptr=vehicles_indptr,
+            vehicles=np.fromiter((car_index[car] for r in requests for car in r.vehicles), dtype=np.int32, count=int(vehicles_indptr[-1])),
+        )
@@ -0,0 +1,140 @@
+"""
+    Selection of the neighbourhood operators (the moves of Solution), with statistics per operator.
+    The parameters are in Problem, with the other Simulated Annealing parameters.
+    Every engine has its own operators (see ENGINES): small moves for 'sa', destroy & repair moves for 'lns', and car
+    moves with an exact rescheduling of the requests around them for 'zones'.
+
+    Roulette wheel selection. In adaptive mode the weights are learned during the run: every `segment` iterations, the
+    reward of every operator is divided by the time spent in it, and the weights move towards those rates by `reaction`.
+    The reward of a move is how much it lowered the cost, so the weights follow the improvement per second.
+    Every operator keeps at least `min_weight` of the total, so an operator that is useless for a while is not lost.
+"""
+import logging
+from itertools import accumulate
+from typing import List
+
+from CarSharing.Solution import Solution
+
+# The operators and their initial weights.
+OPERATORS = (
+    (Solution.move_to_neighbour, 1),
+    (Solution.neighbour_to_self, 1),
+    (Solution.change_car_in_zone, 1),
+    (Solution.unassign_request, 2),
+    (Solution.unassign_car, 2),
+)
+
+# The destroy & repair moves of Large Neighbourhood Search, and their initial weights.
+LNS_OPERATORS = (
+    (Solution.destroy_zone, 1),
+    (Solution.destroy_window, 1),
+    (Solution.destroy_cars, 1),
+)
+
+# The moves of the two level search: only the cars move, the requests around them are rescheduled (see Solution.reschedule).
+ZONES_OPERATORS = (
+    (Solution.move_car, 2),
+    (Solution.swap_cars, 1),
+)
+
+ENGINES = {
+    'sa': OPERATORS,
+    'lns': LNS_OPERATORS,
+    'zones': ZONES_OPERATORS,
+}
+
+
+class Operators:
+    def __init__(self, adaptive: bool, segment: int, reaction: float, min_weight: float, operators=OPERATORS):
+        """
+        :param operators: (function, initial weight) of every operator, see ENGINES
+        """
+        self.adaptive = adaptive
+        self.segment = segment
+        self.reaction = reaction
+        self.min_weight = min_weight
+        self.funcs = [func for func, weight in operators]
+        self.names = [func.__name__ for func in self.funcs]
+        total = sum(weight for func, weight in operators)
+        self.weights = [weight / total for func, weight in operators]
+        self.cum_weights = list(accumulate(self.weights))
+        self.indexes = range(len(self.funcs))
+
+        # Totals for the whole run
+        self.calls = [0] * len(self.funcs)
+        self.accepted = [0] * len(self.funcs)
+        self.improved = [0] * len(self.funcs)
+        self.time = [0.0] * len(self.funcs)
+
+        # Current segment only
+        self.segment_calls = 0
+        self.segment_reward = [0.0] * len(self.funcs)
+        self.segment_time = [0.0] * len(self.funcs)
+
+    def __repr__(self):
+        return 'Operators<{}, {}>'.format('adaptive' if self.adaptive else 'fixed', ', '.join('%s: %.3f' % x for x in zip(self.names, self.weights)))
+
+    def choose(self, rng) -> int:
+        return rng.choices(self.indexes, cum_weights=self.cum_weights)[0]
+
+    def record(self, op: int, elapsed: float, delta: int, accepted: bool):
+        """
+        :param op: operator index, see choose
+        :param elapsed: time spent in the iteration, in seconds
+        :param delta: cost change of the move (0 if no change was made)
+        :param accepted: has the move been accepted?
+        """
+        self.calls[op] += 1
+        self.time[op] += elapsed
+        if accepted:
+            self.accepted[op] += 1
+            if delta < 0:
+                self.improved[op] += 1
+        if self.adaptive:
+            self.segment_time[op] += elapsed
+            if accepted and delta < 0:
+                self.segment_reward[op] -= delta
+            self.segment_calls += 1
+            if self.segment_calls >= self.segment:
+                self.update()
+
+    def update(self):
+        """
+        End of a segment: move the weights towards the reward per second of every operator.
+        Operators that have not been called in this segment keep their weight.
+        """
+        rates = [reward / time for reward, time in zip(self.segment_reward, self.segment_time) if time > 0]
+        total = sum(rates)
+        if total > 0:
+            called = sum(weight for weight, time in zip(self.weights, self.segment_time) if time > 0)
+            for op, time in enumerate(self.segment_time):
+                if time > 0:
+                    # Scaled to the share of the called operators, so the others are not affected.
+                    target = called * self.segment_reward[op] / time / total
+                    self.weights[op] += self.reaction * (target - self.weights[op])
+            self.weights = [max(weight, self.min_weight) for weight in self.weights]
+            total = sum(self.weights)
+            self.weights = [weight / total for weight in self.weights]
+            self.cum_weights = list(accumulate(self.weights))
+
+        self.segment_calls = 0
+        self.segment_reward = [0.0] * len(self.funcs)
+        self.segment_time = [0.0] * len(self.funcs)
+
+    def summary(self) -> List[dict]:
+        """
+        :return: Per operator: calls, acceptance & improvement rate, mean latency (in µs) and current weight.
+        """
+        return [{
+            'operator': name,
+            'calls': calls,
+            'accepted': accepted / calls if calls else 0.0,
+            'improved': improved / calls if calls else 0.0,
+            'latency': 1e6 * time / calls if calls else 0.0,
+            'weight': weight,
+        } for name, calls, accepted, improved, time, weight in zip(self.names, self.calls, self.accepted, self.improved, self.time, self.weights)]
+
+    def log(self, log: logging.Logger):
+        log.debug('%20s %10s %9s %9s %13s %7s', 'operator', 'calls', 'accepted', 'improved', 'latency (µs)', 'weight')
+        for row in self.summary():
+            log.debug('%20s %10d %8.2f%% %8.2f%% %13.1f %7.3f', row['operator'], row['calls'], 100 * row['accepted'], 100 * row['improved'], row['latency'], row['weight'])
@@ -0,0 +1,107 @@
+from typing import List
+
+import numpy as np
+
+from CarSharing.Request import Request
+
+
+class Overlap:
+    """
+    The (symmetric) overlap relation between requests, indexed by Request.index.
+    A request never overlaps with itself.
+    """
+
+    def overlaps(self, i: int, j: int) -> bool:
+        """ Returns True if request i and j overlap in time. """
+        raise NotImplementedError
+
+    def neighbours(self, i: int) -> np.ndarray:
+        """ Returns the (sorted) indexes of all requests that overlap with request i. """
+        raise NotImplementedError
+
+    def to_dense(self) -> np.ndarray:
+        raise NotImplementedError
+
+    @property
+    def nbytes(self) -> int:
+        raise NotImplementedError
+
+
+class DenseOverlap(Overlap):
+    """
+    n x n matrix of booleans, where a True indicates an overlap between that row and col's request.
+    Fastest for small instances, but the memory grows with n².
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def __repr__(self):
+        return 'DenseOverlap<n: {}>'.format(len(self.matrix))
+
+    def overlaps(self, i: int, j: int) -> bool:
+        return self.matrix[i, j]
+
+    def neighbours(self, i: int) -> np.ndarray:
+        return np.flatnonzero(self.matrix[i])
+
+    def to_dense(self) -> np.ndarray:
+        return self.matrix
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    @classmethod
+    def from_pairs(cls, requests: List[Request], i: np.ndarray, j: np.ndarray):
+        n = len(requests)
+        matrix = np.zeros((n, n), dtype=bool)
+        matrix[i, j] = True
+        matrix[j, i] = True
+        return cls(matrix)
+
+
+class SparseOverlap(Overlap):
+    """
+    CSR adjacency lists: The neighbours of request i are indices[indptr[i]:indptr[i + 1]].
+    Most requests never overlap, so this only grows with the amount of overlapping pairs.
+
+    A single pair is checked by comparing the intervals, which is the definition the adjacency lists are built from.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, starts: List[int], ends: List[int]):
+        self.indptr = indptr
+        self.indices = indices
+        # Plain lists, because single element access on those is a lot faster than on np arrays.
+        self.starts = starts
+        self.ends = ends
+
+    def __repr__(self):
+        return 'SparseOverlap<n: {}, pairs: {}>'.format(len(self.indptr) - 1, len(self.indices) // 2)
+
+    def overlaps(self, i: int, j: int) -> bool:
+        return i != j and self.starts[i] <= self.ends[j] and self.starts[j] <= self.ends[i]
+
+    def neighbours(self, i: int) -> np.ndarray:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def to_dense(self) -> np.ndarray:
+        n = len(self.indptr) - 1
+        matrix = np.zeros((n, n), dtype=bool)
+        matrix[np.repeat(np.arange(n), np.diff(self.indptr)), self.indices] = True
+        return matrix
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + 2 * 8 * len(self.starts)
+
+    @classmethod
+    def from_pairs(cls, requests: List[Request], i: np.ndarray, j: np.ndarray):
+        n = len(requests)
+        rows = np.concatenate((i, j)).astype(np.int64)
+        cols = np.concatenate((j, i)).astype(np.int64)
+        order = np.argsort(rows * n + cols)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        indices = cols[order].astype(np.int32)
+        return cls(indptr, indices, [r.real_start for r in requests], [r.real_end for r in requests])
@@ -2,10 +2,15 @@ import logging
 import random
 import math
 import os
+import time
 from typing import List, Dict
 import numpy as np
 
-from CarSharing.RandomDict import RandomDict
+from CarSharing.Metrics import Metrics
+from CarSharing.Model import Model
+from CarSharing.Operators import Operators, ENGINES
+from CarSharing.Overlap import Overlap
+from CarSharing.RandomDict import RandomDict, BiRandomDict
 from CarSharing.Request import Request
 from CarSharing.Solution import Solution
 from CarSharing.Zone import Zone
@@ -20,6 +25,32 @@ t_max = get_from_env_or_default('SA_TMAX', 1000)
 t_min = get_from_env_or_default('SA_TMIN', 10)
 iterations = get_from_env_or_default('SA_ITERATIONS', 5000)
 alpha = get_from_env_or_default('SA_ALPHA', 0.65, type_=float)
+# Change the working solution in place and roll back rejected moves, instead of copying the solution every iteration.
+undo = bool(get_from_env_or_default('SA_UNDO', 1))
+# Iterations between checks of the deadline
+deadline_interval = get_from_env_or_default('DEADLINE_INTERVAL', 16)
+
+# Operator selection (see Operators): 'adaptive' or 'fixed' (the initial weights)
+op_selection = get_from_env_or_default('OP_SELECTION', 'adaptive', type_=str)
+# Iterations between weight updates
+op_segment = get_from_env_or_default('OP_SEGMENT', 500)
+# How fast the weights follow the measured rates (0 = never, 1 = only the last segment counts)
+op_reaction = get_from_env_or_default('OP_REACTION', 0.2, type_=float)
+# Lower bound on the share of every operator
+op_min_weight = get_from_env_or_default('OP_MIN_WEIGHT', 0.03, type_=float)
+
+# LNS engine (see Solution.destroy_*): Cars removed by destroy_cars, width in minutes of destroy_window
+lns_cars = get_from_env_or_default('LNS_CARS', 3)
+lns_window = get_from_env_or_default('LNS_WINDOW', 240)
+# The big moves of the lns & zones engines are 10-100x slower than the small moves, so the temperature steps (and the
+# warm-up, see Schedule) are shorter.
+lns_iterations = get_from_env_or_default('LNS_ITERATIONS', 50)
+lns_warmup = get_from_env_or_default('LNS_WARMUP', 20)
+
+# Initial solution (see Problem.start): 'random' (greedy_assign, random order), or the priority order of priority_assign:
+# 'penalty', 'scarcity' or 'regret' (regret-k, with k = CONSTRUCTION_K)
+construction = get_from_env_or_default('CONSTRUCTION', 'random', type_=str)
+construction_k = get_from_env_or_default('CONSTRUCTION_K', 2)
 
 logging.info('Simulated Annealing parameters: T = %d -> %d with α = %g per %d iterations: %d total iterations.',
              t_max, t_min, alpha, iterations, math.ceil(math.log(t_min / t_max, alpha)) * iterations)
@@ -34,13 +65,15 @@ class Problem:
     cars: List[str]
     days: int
 
-    overlap: np.ndarray
+    overlap: Overlap
+    model: Model
     # opportunity_cost: np.ndarray
     solution: Solution
 
     # def __init__(self, i, rng, requests, request_map, zones, zone_map, cars, days, overlap, opportunity_cost):
-    def __init__(self, i, rng, requests, request_map, zones, zone_map, cars, days, overlap):
+    def __init__(self, i, rng, requests, request_map, zones, zone_map, cars, days, overlap, model, engine='sa'):
         self.log = logging.getLogger('JOB %d' % i)
+        self.i = i
         self.rng = rng
 
         self.requests = requests
@@ -54,14 +87,37 @@ class Problem:
         self.cars = cars
         self.days = days
 
-        # np {(int, int) -> bool}: Indexes are the value indexes of item in requests map.
+        # Overlap relation, dense or sparse. Indexes are the value indexes of item in requests map.
         self.overlap = overlap
         # np {(int) -> int}: Index is the value indexes of item in requests map. Higher means worse to leave unassigned.
         # self.opportunity_cost = opportunity_cost
+        # Integer indexed arrays of the same instance. Car indexes are the indexes in cars.
+        self.model = model
 
         # Solution object, holds assignments etc
         self.solution = None
 
+        # Annealing state, see start()
+        self.current = None
+        self.best = None
+        self.best_cost = None
+        self.iterations = 0
+        # Operator selection & statistics, for the whole lifetime of this problem (not reset by start())
+        # The engine only decides the operators: small moves ('sa'), destroy & repair moves ('lns') or car moves ('zones'), see Operators.
+        self.operators = Operators(op_selection == 'adaptive', op_segment, op_reaction, op_min_weight, ENGINES[engine])
+        # Destroy sizes of the LNS moves
+        self.lns_cars = lns_cars
+        self.lns_window = lns_window
+        # Metrics of the worker (see Metrics). Replace it to keep the metrics of several problems (restarts) together.
+        self.metrics = Metrics(i)
+        # Convergence trace of the worker (see Trace), if any. Gets the current cost after every iteration.
+        self.trace = None
+
+        # Shared best solution board (see Board), if any. Every new best is published to it.
+        self.board = None
+        # time.monotonic() value at which to stop, if any. step() raises TimeoutError once it's passed.
+        self.deadline = None
+
     def __repr__(self):
         return '<CarSharing solution={!r}>'.format(self.solution)
 
@@ -71,61 +127,124 @@ class Problem:
             return
         self.solution.save(file)
 
-    def run(self, debug) -> (int, list):
-        solution = Solution(self, RandomDict.from_random(self.rng), RandomDict.from_random(self.rng))
-        solution.greedy_assign()
-        solution.calculate_cost()
-
-        if debug:
-            stats = [solution.cost]
-
-        i = 0
-        global_best = solution
-        working_solution = solution.copy()
-
-        temp = t_max
-
+    def start(self, debug, initial: Solution = None):
+        """
+        Set up the annealing state, from a new solution (see CONSTRUCTION) or from the given one.
+        """
+        if initial is None:
+            initial = Solution(self, RandomDict.from_random(self.rng), BiRandomDict.from_random(self.rng))
+            if construction == 'random':
+                initial.greedy_assign()
+            else:
+                initial.priority_assign(construction, construction_k)
+
+        self.metrics.run_started(sum(self.operators.accepted))
+        self.current = initial
+        self.iterations = 0
+        if self.trace is not None:
+            self.trace.new_run(initial.cost)
+        # Snapshot of the best solution so far, only (re)taken when a new best appears.
+        # In undo mode this is the encoded solution (2 int arrays), so taking the snapshot is just 2 memcpy's.
+        self.best_cost = initial.cost
+        self.best = initial.encode() if undo else initial
+        self.metrics.best(initial.cost)
+        self.publish()
+
+    def step(self, temp, debug):
+        """
+        A single Simulated Annealing iteration at this temperature.
+        """
+        if self.deadline is not None and not self.iterations % deadline_interval and time.monotonic() >= self.deadline:
+            raise TimeoutError('Deadline reached')
+
+        operators = self.operators
+        op = operators.choose(self.rng)
+        start = time.perf_counter()
+
+        solution = self.current
+        current_cost = solution.cost
+        if undo:
+            # Change the solution in place, but keep a journal to undo the move if it's not accepted.
+            working_solution = solution
+            working_solution.begin()
+        else:
+            working_solution = solution.copy()
+
+        # Generate random neighbour of solution
+        delta_e = 0
+        accepted = False
+        if operators.funcs[op](working_solution):
+            # The moves keep the cost up to date, only do the full recompute as a consistency check.
+            if debug:
+                working_solution.check_cost()
+            # Calculate energy difference
+            delta_e = working_solution.cost - current_cost
+
+            # If the new solution is better accept it, if it's worse accept it anyway with a probability
+            if delta_e <= 0 or math.exp(-delta_e / temp) > self.rng.random():
+                self.accept(working_solution)
+                accepted = True
+            elif undo:
+                working_solution.rollback()
+        elif undo:
+            working_solution.rollback()
+
+        operators.record(op, time.perf_counter() - start, delta_e, accepted)
+        self.iterations += 1
+        if self.trace is not None:
+            self.trace.add(self.current.cost)
+
+    def accept(self, solution: Solution):
+        """
+        Make this the current solution, and take a snapshot if it's a new best.
+        """
+        self.current = solution
+        if undo:
+            solution.commit()
+        if solution.cost < self.best_cost:
+            self.best_cost = solution.cost
+            self.best = solution.encode() if undo else solution
+            self.metrics.best(solution.cost)
+            self.publish()
+
+    def publish(self):
+        """
+        Put the best snapshot on the shared board, if it beats what's there.
+        """
+        board = self.board
+        if board is not None and (board.cost is None or self.best_cost < board.cost):
+            board.publish(self.best_cost, *(self.best if undo else self.best.encode()), self.i)
+
+    def run_finished(self, temp, aborted: bool):
+        """
+        Report the end of a run to the metrics.
+        """
+        self.metrics.run_finished(temp, self.iterations, sum(self.operators.accepted), self.best_cost, aborted, self.operators.summary())
+
+    def finish(self):
+        """
+        Turn the best snapshot into the final solution.
+        """
+        self.solution = Solution.decode(self, *self.best) if undo else self.best
+
+    def run(self, debug, schedule, initial: Solution = None) -> (int, bool):
+        """
+        One Simulated Annealing run, with the temperature steps from the schedule (see Schedule).
+        """
+        self.start(debug, initial)
+
+        temp = None
         aborted = False
         try:
             # Simulated Annealing
-            while temp >= t_min:                    # Iterate until stop-condition is reached
-                for x in range(iterations):         # Iterate until equilibrium is reached
-                    func = self.rng.choice((
-                        working_solution.move_to_neighbour,
-                        working_solution.neighbour_to_self,
-                        working_solution.change_car_in_zone,
-                        working_solution.unassign_request,
-                        working_solution.unassign_request,  # 2x more likely
-                        working_solution.unassign_car,
-                        working_solution.unassign_car,  # 2x more likely
-                    ))
-
-                    # Generate random neighbour of solution
-                    if func():
-                        # Calculate energy difference
-                        working_solution.calculate_cost()
-                        delta_e = working_solution.cost - global_best.cost
-
-                        if delta_e <= 0:
-                            # This solution is better, save it
-                            global_best = working_solution
-                            solution = working_solution
-                        # New solution is worse, accept it anyway with a probability
-                        elif math.exp(-delta_e / temp) > self.rng.random():
-                            global_best = working_solution
-                            solution = working_solution
-
-                    working_solution = solution.copy()
-
-                    i += 1
-                    if debug:
-                        stats.append(working_solution.cost)
-
-                # Apply cooling and reduce temp
-                temp = temp * alpha
+            for temp, n in schedule.temperatures(self.log):     # Iterate until stop-condition is reached
+                for x in range(n):                              # Iterate until equilibrium is reached
+                    self.step(temp, debug)
+                self.metrics.step(temp, self.iterations, sum(self.operators.accepted))
 
         except (KeyboardInterrupt, TimeoutError):
             aborted = True
 
-        self.solution = global_best
-        return i, stats if debug else (), aborted
+        self.run_finished(temp, aborted)
+        self.finish()
+        return self.iterations, aborted
@@ -6,9 +6,10 @@
 
     Added by Dries: + Ability to use preset rng for deterministic random.
                     + Made this class more like a real dict, with __contains__, keys, values, items, ...
+                    + BiRandomDict, which also keeps the inverse (value -> keys) mapping.
 """
 import random
-from collections import MutableMapping
+from collections.abc import MutableMapping
 
 __version__ = '0.2.0'
 
@@ -77,6 +78,11 @@ class RandomDict(MutableMapping):
     def __contains__(self, key):
         return key in self._keys
 
+    def get(self, key, default=None):
+        """ Without the KeyError of the MutableMapping version, that is slow for missing keys. """
+        i = self._keys.get(key)
+        return default if i is None else self._values[i][1]
+
     def items(self):
         return self._values
 
@@ -104,12 +110,65 @@ class RandomDict(MutableMapping):
         return k, self[k]
 
     def copy(self):
-        return RandomDict.from_random(self._rng, self.items())
+        """ Copy the internal structures directly, instead of inserting every item again. """
+        instance = type(self).from_random(self._rng)
+        instance._keys = self._keys.copy()
+        instance._values = self._values.copy()
+        instance._last_index = self._last_index
+        return instance
 
     @classmethod
     def from_random(cls, rng, *args, **kwargs):
         instance = cls(*args, **kwargs)
-        instance.rng = rng
+        instance._rng = rng
+        return instance
+
+
+class BiRandomDict(RandomDict):
+    """
+    RandomDict that also keeps the inverse mapping: value -> keys with that value.
+    Listing or deleting all keys with a certain value is proportional to the amount of those keys, not the size of the dict.
+    Values must be hashable.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # mapping of values to {key -> None}, a dict to keep the order deterministic
+        self._inverse = {}
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, key, val):
+        if key in self._keys:
+            self._discard_inverse(key, self[key])
+        super().__setitem__(key, val)
+        keys = self._inverse.get(val)
+        if keys is None:
+            self._inverse[val] = {key: None}
+        else:
+            keys[key] = None
+
+    def __delitem__(self, key):
+        self._discard_inverse(key, self[key])
+        super().__delitem__(key)
+
+    def _discard_inverse(self, key, val):
+        keys = self._inverse[val]
+        del keys[key]
+        if not keys:
+            del self._inverse[val]
+
+    def delete_by_value(self, needle):
+        # Must be a list, because we can't modify the dict we are looping over.
+        for key in list(self.keys_by_value(needle)):
+            del self[key]
+
+    def keys_by_value(self, needle):
+        """ All keys with this value, in O(1) time """
+        keys = self._inverse.get(needle)
+        return () if keys is None else keys.keys()
+
+    def copy(self):
+        instance = super().copy()
+        instance._inverse = {val: keys.copy() for val, keys in self._inverse.items()}
         return instance
 
 # class RandomDictType(RandomDict, typing.MutableMapping[typing.KT, typing.VT], extra=RandomDict):
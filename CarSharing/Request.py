@@ -1,21 +1,25 @@
-from typing import List
+import sys
+from typing import Tuple
 
 from CarSharing.Zone import Zone
 
 
 class Request:
+    __slots__ = ('id', 'zone', 'day', 'start', 'duration', 'vehicles', 'penalty1', 'penalty2', 'index', 'real_start', 'real_end')
+
     def __init__(self, id, zone, day, start, duration, vehicles, penalty1, penalty2, index):
         self.id: str = id
         self.zone: Zone = zone  # Initially a string, then replaced after the zones have been read.
         self.day: int = int(day)
         self.start: int = int(start)
         self.duration: int = int(duration)
-        self.vehicles: List[str] = vehicles.split(",")
+        # Interned, so all requests share the same car strings and dict lookups on them can compare by identity.
+        self.vehicles: Tuple[str, ...] = tuple(map(sys.intern, vehicles.split(",")))
         self.penalty1: int = int(penalty1)  # Not assigned
         self.penalty2: int = int(penalty2)  # Assigned to neighbour
         self.index: int = index  # index in the numpy matrices
-        self.real_start = (self.day * 24 * 60) + self.start
-        self.real_end = self.real_start + self.duration
+        self.real_start: int = (self.day * 24 * 60) + self.start
+        self.real_end: int = self.real_start + self.duration
 
     def __repr__(self):
         return 'Request<id: {!r}, zone: {!r}, day: {!r}, start: {!r}, duration: {!r}, vehicles: {!r}, pen1: {!r}, pen2: {!r}>' \
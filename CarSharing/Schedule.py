@@ -0,0 +1,104 @@
+"""
+    Cooling schedules for Simulated Annealing.
+
+    A schedule gives the temperature steps of one run, as (temperature, iterations) pairs.
+    The fixed schedule uses the SA_* parameters as is, so how far a run gets before the time is up depends on the machine
+    and the instance. The timed schedule fits the cooling to the time budget instead: it measures the iterations per
+    second during a short warm-up at t_max, and then sets alpha so the run reaches t_min exactly at the end.
+    It keeps measuring after every temperature step, so it adapts when the iterations get faster or slower while cooling.
+"""
+import logging
+import math
+import time
+from typing import Iterator, Optional, Tuple
+
+from CarSharing.Problem import get_from_env_or_default, t_max, t_min, iterations, alpha, lns_iterations, lns_warmup
+
+# 'timed' (fit to the runtime, if there is one) or 'fixed'
+schedule = get_from_env_or_default('SA_SCHEDULE', 'timed', type_=str)
+# Timed schedule: The amount of runs (restarts) the runtime is split over, per worker.
+runs = get_from_env_or_default('SA_RUNS', 1)
+# Timed schedule: Iterations at t_max to measure the speed
+warmup = get_from_env_or_default('SA_WARMUP', 1000)
+
+
+class Schedule:
+    """
+    The fixed schedule: t_max -> t_min, multiplied by alpha every `iterations` iterations.
+    The parameters default to the SA_* environment variables.
+    """
+
+    def __init__(self, t_max: float = t_max, t_min: float = t_min, alpha: float = alpha, iterations: int = iterations):
+        self.t_max = t_max
+        self.t_min = t_min
+        self.alpha = alpha
+        self.iterations = iterations
+
+    def __repr__(self):
+        return 'Schedule<fixed, T: {} -> {}, α: {:g} per {}>'.format(self.t_max, self.t_min, self.alpha, self.iterations)
+
+    def temperatures(self, log: logging.Logger) -> Iterator[Tuple[float, int]]:
+        temp = self.t_max
+        while temp >= self.t_min:
+            yield temp, self.iterations
+            temp = temp * self.alpha
+
+    @classmethod
+    def create(cls, end: Optional[float], engine: str = 'sa') -> 'Schedule':
+        """
+        :param end: time.monotonic() value at which the runs must be done, None if there is no time limit.
+        :param engine: The moves the runs use (see Operators.ENGINES), all but 'sa' get the LNS_* step lengths.
+        """
+        steps, warm = (iterations, warmup) if engine == 'sa' else (lns_iterations, lns_warmup)
+        if schedule == 'timed' and end is not None:
+            return TimedSchedule(end, runs, iterations=steps, warmup=warm)
+        return cls(iterations=steps)
+
+
+class TimedSchedule(Schedule):
+    """
+    Cools from t_max to t_min in the time that is left, split evenly over the runs that are left.
+    The steps are `iterations` long (except the last one), alpha is what makes the steps fit in the time.
+    """
+
+    def __init__(self, end: float, runs: int, t_max: float = t_max, t_min: float = t_min, iterations: int = iterations, warmup: int = warmup):
+        super().__init__(t_max, t_min, None, iterations)
+        self.end = end
+        self.runs = runs
+        self.warmup = warmup
+
+    def __repr__(self):
+        return 'Schedule<timed, T: {} -> {}, {} runs left, {:.3f} s left>'.format(self.t_max, self.t_min, self.runs, self.end - time.monotonic())
+
+    def temperatures(self, log: logging.Logger) -> Iterator[Tuple[float, int]]:
+        start = time.monotonic()
+        if self.runs <= 0 or start >= self.end:
+            raise TimeoutError('No time left for another run')
+        end = start + (self.end - start) / self.runs
+        self.runs -= 1
+
+        temp = self.t_max
+        n = self.warmup
+        calibrated = False
+        while True:
+            step_start = time.monotonic()
+            yield temp, n
+            now = time.monotonic()
+
+            remaining = end - now
+            if remaining <= 0 or temp <= self.t_min:
+                return
+            # Iterations per second, as measured on the last step
+            rate = n / max(now - step_start, 1e-6)
+            # Amount of full steps that still fit in the remaining time
+            steps = rate * remaining / self.iterations
+            if steps <= 1:
+                temp = self.t_min
+                n = max(1, math.ceil(rate * remaining))
+            else:
+                step_alpha = (self.t_min / temp) ** (1 / steps)
+                if not calibrated:
+                    calibrated = True
+                    log.debug('Calibrated schedule: %d Hz, %.3f s -> α: %g per %d iterations, %d steps', rate, remaining, step_alpha, self.iterations, steps)
+                temp = temp * step_alpha
+                n = self.iterations
@@ -1,36 +1,111 @@
+import heapq
 import logging
-from typing import TYPE_CHECKING, Iterable
+from typing import TYPE_CHECKING, Iterable, Dict, List, Tuple, Optional
 
 import math
 import numpy as np
 
-from CarSharing.RandomDict import RandomDict
+from CarSharing.CarSchedule import CarSchedule, best_subset
+from CarSharing.Metrics import timed
+from CarSharing.RandomDict import RandomDict, BiRandomDict
 from CarSharing.Request import Request
 
 if TYPE_CHECKING:
     from .Problem import Problem
 
 
+# Static request orders of priority_assign: lowest key first.
+PRIORITIES = {
+    # The most penalty per minute of car time first
+    'penalty': lambda req: -req.penalty1 / req.duration,
+    # The fewest compatible cars first, then the highest penalty
+    'scarcity': lambda req: (len(req.vehicles), -req.penalty1),
+}
+
+
 class Solution:
+    __slots__ = ('problem', 'car_zone', 'req_car', 'schedules', 'unassigned', 'freed', 'assignment', 'placement', 'cost', 'journal')
+
     if TYPE_CHECKING:
         problem: Problem
     car_zone: RandomDict
-    req_car: RandomDict
-
-    def __init__(self, problem, car_zone, req_car, cost=None):
+    req_car: BiRandomDict
+    schedules: Dict[str, CarSchedule]
+    unassigned: RandomDict
+    freed: Optional[List[Tuple[Optional[Request], str]]]
+    assignment: np.ndarray
+    placement: np.ndarray
+
+    def __init__(self, problem, car_zone, req_car, cost=None, schedules=None, unassigned=None, assignment=None, placement=None):
         self.problem = problem
         self.car_zone = car_zone
         self.req_car = req_car
+        # The same assignments as int arrays, see Model: request index -> car index and car index -> zone index (or -1).
+        if assignment is None:
+            car_index = problem.model.car_index
+            assignment = problem.model.empty_assignment()
+            for req, car in req_car.items():
+                assignment[req.index] = car_index[car]
+            placement = problem.model.empty_placement()
+            for car, zone in car_zone.items():
+                placement[car_index[car]] = zone.index
+        self.assignment = assignment
+        self.placement = placement
+        # {str car -> CarSchedule}: The assigned requests per car, sorted in time.
+        if schedules is None:
+            schedules = {}
+            for req, car in req_car.items():
+                if car not in schedules:
+                    schedules[car] = CarSchedule()
+                schedules[car].add(req)
+        self.schedules = schedules
+        # {Request -> None}: All requests that are not in req_car.
+        if unassigned is None:
+            unassigned = RandomDict.from_random(problem.rng, ((r, None) for r in problem.requests if r not in req_car))
+        self.unassigned = unassigned
+        # What was freed since the last greedy_assign: (request, car) for a freed slot, (None, car) for a freed car.
+        # None means everything has to be tried, because there hasn't been a greedy_assign yet.
+        self.freed = None if cost is None else []
+        # Running cost, kept up to date by every change made via the _assign/_unassign/_place_car/_remove_car helpers.
         self.cost = cost
+        if cost is None:
+            self.calculate_cost()
+        # Undo journal of (kind, key, old value) tuples, only recorded between begin() and commit()/rollback().
+        self.journal = None
 
     def __repr__(self):
         return '<Solution: Last run cost={}>'.format(self.cost)
 
+    @timed('copy')
     def copy(self):
-        return Solution(self.problem, self.car_zone.copy(), self.req_car.copy(), self.cost)
+        schedules = {car: schedule.copy() for car, schedule in self.schedules.items()}
+        return Solution(self.problem, self.car_zone.copy(), self.req_car.copy(), self.cost, schedules, self.unassigned.copy(),
+                        self.assignment.copy(), self.placement.copy())
 
+    def encode(self) -> (np.ndarray, np.ndarray):
+        """
+        Compact copy of this solution: (request index -> car index, car index -> zone index) int arrays, -1 = unassigned.
+        """
+        return self.assignment.copy(), self.placement.copy()
+
+    @classmethod
+    def decode(cls, problem, assignment: np.ndarray, placement: np.ndarray):
+        """
+        Rebuild a full Solution from the output of encode().
+        """
+        car_zone = RandomDict.from_random(problem.rng, (
+            (problem.cars[car], problem.zones[zone]) for car, zone in enumerate(placement.tolist()) if zone >= 0))
+        req_car = BiRandomDict.from_random(problem.rng, (
+            (problem.requests[req], problem.cars[car]) for req, car in enumerate(assignment.tolist()) if car >= 0))
+        return cls(problem, car_zone, req_car, assignment=assignment.copy(), placement=placement.copy())
+
+    @timed('calculate_cost')
     def calculate_cost(self) -> int:
-        cost = sum(req.penalty2 for req, car in self.req_car.items() if req.zone.id in self.car_zone[car].neighbours)
+        """
+        Full recompute of the cost, O(n). The moves keep self.cost up to date, so this is only needed as a check.
+        """
+        car_zone = self.car_zone
+        cost = sum(req.penalty2 for req, car in self.req_car.items() if car_zone[car] in req.zone.neighbours)
 
         # for req, car in self.req_car.items():
         #     # Check if a request is matched to car in it's own or neighbouring zone.
@@ -39,7 +114,7 @@ class Solution:
         #         raise RuntimeError('Request {} assigned to Car {} that is not in a zone.'.format(req, req))
         #     if req.zone == zone:
         #         pass
-        #     elif req.zone.id in zone.neighbours:
+        #     elif req.zone.id in zone.neighbour_ids:
         #         cost += req.penalty2
         #     else:
         #         logging.warning('Not feasible, request {} not in zone or neighbours ({}).'.format(req, zone))
@@ -53,10 +128,127 @@ class Solution:
         #             return False, math.inf
 
         # Cost for unassigned requests
-        cost += sum(r.penalty1 for r in self.get_unassigned(shuffle=False))
+        cost += sum(r.penalty1 for r in self.problem.requests if r not in self.req_car)
         self.cost = cost
         return cost
 
+    def check_cost(self):
+        """
+        Debug consistency check: Compare the running cost against a full recompute.
+        """
+        running = self.cost
+        if self.calculate_cost() != running:
+            raise RuntimeError('Running cost {} does not match recalculated cost {}.'.format(running, self.cost))
+        if self.problem.model.cost(self.assignment, self.placement) != running:
+            raise RuntimeError('Running cost {} does not match the cost of the encoded solution {}.'.format(
+                running, self.problem.model.cost(self.assignment, self.placement)))
+        if len(self.unassigned) + len(self.req_car) != len(self.problem.requests):
+            raise RuntimeError('Unassigned set out of sync: {} unassigned + {} assigned != {} requests.'.format(
+                len(self.unassigned), len(self.req_car), len(self.problem.requests)))
+
+    def begin(self):
+        """
+        Start recording all changes, so they can be undone with rollback().
+        """
+        self.journal = []
+
+    def commit(self):
+        """
+        Keep all changes since begin().
+        """
+        self.journal = None
+
+    def rollback(self):
+        """
+        Undo all changes since begin(), in reverse order.
+        """
+        journal, self.journal = self.journal, None
+        for kind, key, old in reversed(journal):
+            if kind == 'car':
+                if old is None:
+                    self._unplace_car(key)
+                else:
+                    self._place_car(key, old)
+            elif old is None:
+                self._unassign(key)
+            else:
+                self._assign(key, old)
+        # Back to the state after the last repair, so nothing is freed.
+        self.freed = []
+
+    def request_cost(self, req: Request, car: str = None) -> int:
+        """
+        Cost contribution of a single request if it were assigned to car (None = unassigned).
+        """
+        if car is None:
+            return req.penalty1
+        if self.car_zone[car] in req.zone.neighbours:
+            return req.penalty2
+        return 0
+
+    def _assign(self, req: Request, car: str):
+        """
+        (Re)assign a request to a car, and update the running cost with the delta.
+        """
+        old = self.req_car.get(req)
+        if self.journal is not None:
+            self.journal.append(('req', req, old))
+        self.cost += self.request_cost(req, car) - self.request_cost(req, old)
+        self.req_car[req] = car
+        self.assignment[req.index] = self.problem.model.car_index[car]
+        if old is None:
+            del self.unassigned[req]
+        else:
+            self.schedules[old].remove(req)
+            if self.freed is not None:
+                self.freed.append((req, old))
+        if car not in self.schedules:
+            self.schedules[car] = CarSchedule()
+        self.schedules[car].add(req)
+
+    def _unassign(self, req: Request):
+        """
+        Unassign a request, and update the running cost with the delta.
+        """
+        old = self.req_car[req]
+        if self.journal is not None:
+            self.journal.append(('req', req, old))
+        self.cost += req.penalty1 - self.request_cost(req, old)
+        del self.req_car[req]
+        self.assignment[req.index] = -1
+        self.schedules[old].remove(req)
+        self.unassigned[req] = None
+        if self.freed is not None:
+            self.freed.append((req, old))
+
+    def _place_car(self, car: str, zone):
+        """
+        Put a car in a zone. The car must not have any requests assigned, so the cost does not change.
+        """
+        if self.journal is not None:
+            self.journal.append(('car', car, self.car_zone.get(car)))
+        self.car_zone[car] = zone
+        self.placement[self.problem.model.car_index[car]] = zone.index
+
+    def _unplace_car(self, car: str):
+        """
+        Take a car out of its zone. The car must not have any requests assigned, so the cost does not change.
+        """
+        del self.car_zone[car]
+        self.placement[self.problem.model.car_index[car]] = -1
+
+    def _remove_car(self, car: str):
+        """
+        Remove a car from its zone, unassigning all of its requests first.
+        """
+        for req in list(self.req_car.keys_by_value(car)):
+            self._unassign(req)
+        if self.journal is not None:
+            self.journal.append(('car', car, self.car_zone[car]))
+        self._unplace_car(car)
+        if self.freed is not None:
+            self.freed.append((None, car))
+
     def save(self, file):
         logging.info('Saving a solution with score %r', self.cost)
 
@@ -80,9 +272,9 @@ class Solution:
 
     def get_requests_by_car(self, car_needle: str, shuffle=True) -> Iterable[Request]:
         """
-        Generator. Use in for loops.
+        Iterable. Use in for loops, but don't change the assignments of this car while looping.
         """
-        items = (req for req, car in self.req_car.items() if car == car_needle)
+        items = self.req_car.keys_by_value(car_needle)
         if shuffle:
             items = list(items)
             self.problem.rng.shuffle(items)
@@ -92,33 +284,71 @@ class Solution:
         """
         Generator. Use in for loops.
         """
-        filtered = (r for r in self.problem.requests if r not in self.req_car)
+        filtered = self.unassigned.keys()
         if shuffle:
             filtered = list(filtered)
             self.problem.rng.shuffle(filtered)
         return filtered
 
+    def get_repair_candidates(self) -> List[Request]:
+        """
+        The unassigned requests that might fit somewhere since the last greedy_assign.
+        After a repair every unassigned request is blocked, so only requests that are freed themselves,
+        requests that overlap with a freed slot on a car they can use, or requests that can use a freed car can fit now.
+        """
+        if self.freed is None:
+            return self.get_unassigned(shuffle=True)
+
+        overlap = self.problem.overlap
+        requests = self.problem.requests
+        model = self.problem.model
+        unassigned = self.unassigned
+        # Dict instead of set, to keep the order (and so the RNG) deterministic.
+        candidates = {}
+        # A freed car already makes all of its requests candidates, the slots freed on it don't add anything.
+        freed_cars = {car for req, car in self.freed if req is None}
+        for req, car in self.freed:
+            # Only the requests that can use this car, instead of all unassigned requests.
+            if req is None:
+                for i in model.car_requests_of(model.car_index[car]).tolist():
+                    r = requests[i]
+                    if r in unassigned:
+                        candidates[r] = None
+                continue
+            if req in unassigned:
+                candidates[req] = None
+            if car in freed_cars:
+                continue
+            for i in model.car_requests_of(model.car_index[car]).tolist():
+                r = requests[i]
+                if r in unassigned and overlap.overlaps(req.index, i):
+                    candidates[r] = None
+
+        candidates = list(candidates)
+        self.problem.rng.shuffle(candidates)
+        return candidates
+
     def check_overlap_car_request(self, car: str, request: Request):
         """
         Returns True if there is overlap between the already assigned requests and a new one.
         """
-        # All indexes with overlap
-        overlap = self.problem.overlap[request.index]
-        for r in self.get_requests_by_car(car, shuffle=False):
-            if overlap[r.index]:
-                return True
-        return False
+        schedule = self.schedules.get(car)
+        return schedule is not None and schedule.overlaps(request, self.problem.overlap)
 
+    @timed('greedy_assign')
     def greedy_assign(self, to_assign=None):
         """
         Used for the initial solution, but can also to used after changes to fill in the blanks.
-        By default works on the unassigned set. Otherwise specify to_assign.
+        By default works on the unassigned requests that could fit since the last repair. Otherwise specify to_assign.
         """
         if to_assign is None:
-            to_assign = self.get_unassigned(shuffle=True)
+            to_assign = self.get_repair_candidates()
+            self.freed = []
 
+        car_zone = self.car_zone
         for request in to_assign:
             selected_car = None
+            neighbours = request.zone.neighbours
 
             # Check to see if a car is already assigned to this zone, if it is non-overlapping, use that.
             # Also store free cars
@@ -126,23 +356,21 @@ class Solution:
             # Also store possible neighbours
             possible_neighbours = []
             for car in request.vehicles:
-
-                if car in self.car_zone:
-                    zone = self.car_zone[car]
-                else:
+                zone = car_zone.get(car)
+                if zone is None:
                     # Car still unassigned, skip for now.
                     if car not in free_cars:
                         free_cars.append(car)
                     continue
 
                 # Car is assigned to a zone.
-                if request.zone == zone:
+                if request.zone is zone:
                     # Car is assigned to our zone. Now check overlap.
                     if not self.check_overlap_car_request(car, request):
                         # Found a match!
                         selected_car = car
                         break
-                elif request.zone.id in zone.neighbours:
+                elif zone in neighbours:
                     # Car is assigned to our neighbour. Now check overlap.
                     if not self.check_overlap_car_request(car, request):
                         # If we don't find a direct match, we can use this later.
@@ -157,13 +385,295 @@ class Solution:
                     # Pick one at random from the free car pile
                     selected_car = self.problem.rng.choice(free_cars)
                     # Assign the car to this zone.
-                    self.car_zone[selected_car] = request.zone
+                    self._place_car(selected_car, request.zone)
                 else:
                     # This request will be left unassigned.
                     continue
 
             # Here we must have a selected car.
-            self.req_car[request] = selected_car
+            self._assign(request, selected_car)
+
+    @timed('priority_assign')
+    def priority_assign(self, priority: str = 'penalty', k: int = 2):
+        """
+        Construction in priority order, instead of the random order of greedy_assign. Every request gets its best option
+        (see insertion, the ties by fit), or stays unassigned if it has none.
+        The order comes from a heap, by a static key (see PRIORITIES) or with 'regret' by regret-k: the extra cost if
+        the request does not get its best option, but one of its next k - 1 (the penalty for every missing option).
+        An assignment only changes the option on its own car, so only that option of the requests that can use the car
+        (and overlap with it, if the car was placed already) is evaluated again. Ties are broken at random, so restarts
+        get different solutions.
+        """
+        requests = self.problem.requests
+        model = self.problem.model
+        overlap = self.problem.overlap
+        rng = self.problem.rng
+        car_index = model.car_index
+        # Per car index: the amount of requests that can use it
+        flexibility = np.diff(model.car_requests_indptr).tolist()
+        to_assign = self.get_repair_candidates()
+        self.freed = []
+
+        def insertions(req):
+            return [option for option in (self.insertion(req, car) for car in req.vehicles) if option is not None]
+
+        def fit(option):
+            # Cheapest first, a car in the zone before placing a free one. Then the placed car with the least free time
+            # left (best fit), so the emptier cars stay open for later. Or the free car the fewest requests can use.
+            cost, place, car = option
+            if place:
+                return cost, place, flexibility[car_index[car]], car
+            schedule = self.schedules.get(car)
+            return cost, place, -sum(req.duration for req in schedule) if schedule is not None else 0, car
+
+        # {Request -> {car -> cost}}: The options of the pending requests, only kept (up to date) for 'regret'.
+        costs = {}
+
+        if priority == 'regret':
+            def key(req):
+                best = heapq.nsmallest(k, costs[req].values())
+                best += [req.penalty1] * (k - len(best))
+                return -sum(best) + k * best[0], -req.penalty1
+        else:
+            key = PRIORITIES[priority]
+
+        # {Request -> stamp}: The pending requests, with the stamp of their current entry. Older entries are skipped.
+        stamps = {}
+        heap = []
+
+        def push(req):
+            stamps[req] = stamp = rng.random()
+            heapq.heappush(heap, (key(req), stamp, req.index))
+
+        for request in to_assign:
+            if priority == 'regret':
+                costs[request] = {car: cost for cost, place, car in insertions(request)}
+            push(request)
+
+        while heap:
+            _, stamp, i = heapq.heappop(heap)
+            request = requests[i]
+            if stamps.get(request) != stamp:
+                continue
+            del stamps[request]
+            costs.pop(request, None)
+            options = insertions(request)
+            if not options:
+                continue
+            cost, place, _, car = min(map(fit, options))
+            if place:
+                self._place_car(car, request.zone)
+            self._assign(request, car)
+            if priority == 'regret':
+                # A placed car is a new option (or none) for all of its requests, otherwise only the overlapping ones lose it.
+                for j in model.car_requests_of(car_index[car]).tolist():
+                    req = requests[j]
+                    if req in stamps and (place or overlap.overlaps(i, j)):
+                        option = self.insertion(req, car)
+                        if option is None:
+                            costs[req].pop(car, None)
+                        else:
+                            costs[req][car] = option[0]
+                        push(req)
+
+    def insertion(self, request: Request, car: str) -> Optional[Tuple[int, bool, str]]:
+        """
+        How this request can be assigned to this car as it is now: (cost, car has to be placed in the request's zone, car).
+        None if it can't.
+        """
+        zone = self.car_zone.get(car)
+        if zone is None:
+            return 0, True, car
+        if zone is request.zone:
+            cost = 0
+        elif zone in request.zone.neighbours:
+            cost = request.penalty2
+        else:
+            return None
+        if self.check_overlap_car_request(car, request):
+            return None
+        return cost, False, car
+
+    def regret_assign(self, to_assign=None):
+        """
+        The repair of the LNS moves: regret insertion. Every round, the request with the biggest regret (how much it
+        costs extra if its best option is taken by someone else, the penalty of not assigning it if it has only one)
+        gets its best option. Ties go to the highest penalty. An insertion only changes the option on its own car,
+        so only that one is evaluated again: the work scales with the destroyed part, not with the instance.
+        By default works on the unassigned requests that could fit since the last repair, like greedy_assign.
+        """
+        if to_assign is None:
+            to_assign = self.get_repair_candidates()
+            self.freed = []
+
+        # {Request -> {car -> option}}, see insertion
+        options = {}
+        # {Request -> (regret, penalty1, best option)}
+        scores = {}
+
+        def score(req):
+            # A car in the zone goes before placing a free one, then the order of the vehicles.
+            best, *rest = sorted(options[req].values(), key=lambda option: option[:2])
+            scores[req] = (rest[0][0] if rest else req.penalty1) - best[0], req.penalty1, best
+
+        for request in to_assign:
+            insertions = {}
+            for car in request.vehicles:
+                option = self.insertion(request, car)
+                if option is not None:
+                    insertions[car] = option
+            if insertions:
+                options[request] = insertions
+                score(request)
+
+        while scores:
+            request = max(scores, key=lambda req: scores[req][:2])
+            cost, place, car = scores.pop(request)[2]
+            del options[request]
+            if place:
+                self._place_car(car, request.zone)
+            self._assign(request, car)
+            for req, insertions in list(options.items()):
+                if car in insertions:
+                    option = self.insertion(req, car)
+                    if option is not None:
+                        insertions[car] = option
+                    elif len(insertions) > 1:
+                        del insertions[car]
+                    else:
+                        del options[req], scores[req]
+                        continue
+                    score(req)
+
+    def destroy_zone(self, zone=None) -> bool:
+        """
+        LNS move: Unassign all requests in a zone and its neighbours, and take the cars out of the zone itself, then repair.
+        :param zone: Zone to clear, or None for the zone of a random assigned request
+        :return: bool: Has a change been made?
+        """
+        if zone is None:
+            zone = self.req_car.random_key().zone
+        region = zone.feasible
+        requests = [req for req, car in self.req_car.items() if req.zone in region]
+        cars = [car for car, car_zone in self.car_zone.items() if car_zone is zone]
+        if not requests and not cars:
+            return False
+        for req in requests:
+            self._unassign(req)
+        for car in cars:
+            self._remove_car(car)
+        self.regret_assign()
+        return True
+
+    def destroy_window(self, start: int = None) -> bool:
+        """
+        LNS move: Unassign all requests that overlap with a time window of problem.lns_window minutes, then repair.
+        The cars stay where they are.
+        :param start: Start of the window (in minutes, like Request.real_start), or None for around a random assigned request
+        :return: bool: Has a change been made?
+        """
+        width = self.problem.lns_window
+        if start is None:
+            start = self.req_car.random_key().real_start - width // 2
+        end = start + width
+        requests = [req for req, car in self.req_car.items() if req.real_start < end and req.real_end > start]
+        if not requests:
+            return False
+        for req in requests:
+            self._unassign(req)
+        self.regret_assign()
+        return True
+
+    def destroy_cars(self, cars: List[str] = None) -> bool:
+        """
+        LNS move: Remove problem.lns_cars random cars (with all of their requests) from their zones, then repair.
+        :param cars: Cars to remove, or None for random placed cars
+        :return: bool: Has a change been made?
+        """
+        if cars is None:
+            if not self.car_zone:
+                return False
+            cars = list({self.car_zone.random_key(): None for _ in range(self.problem.lns_cars)})
+        for car in cars:
+            if car in self.car_zone:
+                self._remove_car(car)
+        self.regret_assign()
+        return True
+
+    def reschedule(self, cars: List[str]):
+        """
+        The lower level of the zones engine: Schedule these (placed, empty) cars exactly, one after the other.
+        Every request the car could serve from its zone is a candidate, assigned or not, weighted by what it saves: its
+        current cost, minus the cost with this car. The candidates without overlap with the most savings in total go to
+        the car (weighted interval scheduling, see best_subset), even if that takes them from another car.
+        A greedy repair fills the slots this frees on the other cars.
+        """
+        model = self.problem.model
+        requests = self.problem.requests
+        for car in cars:
+            zone = self.car_zone[car]
+            candidates = []
+            weights = []
+            for i in model.car_requests_of(model.car_index[car]).tolist():
+                req = requests[i]
+                if zone in req.zone.feasible:
+                    saving = self.request_cost(req, self.req_car.get(req)) - (0 if req.zone is zone else req.penalty2)
+                    if saving > 0:
+                        candidates.append(req)
+                        weights.append(saving)
+            for req in best_subset(candidates, weights):
+                self._assign(req, car)
+        self.greedy_assign()
+
+    def move_car(self, car: str = None, zone=None) -> bool:
+        """
+        Zones engine move: Put a car in another zone, with the best schedule it can have there.
+        :param car: Car to move, or None for a random car (placed or not)
+        :param zone: Zone to move to, or None for the zone of a random request the car can serve
+        :return: bool: Has a change been made?
+        """
+        rng = self.problem.rng
+        if car is None:
+            car = rng.choice(self.problem.cars)
+        if zone is None:
+            model = self.problem.model
+            compatible = model.car_requests_of(model.car_index[car])
+            if not len(compatible):
+                return False
+            zone = self.problem.requests[compatible[rng.randrange(len(compatible))]].zone
+        if self.car_zone.get(car) is zone:
+            return False
+
+        if car in self.car_zone:
+            self._remove_car(car)
+        self._place_car(car, zone)
+        self.reschedule([car])
+        return True
+
+    def swap_cars(self, a: str = None, b: str = None) -> bool:
+        """
+        Zones engine move: Swap the zones of 2 placed cars, with the best schedules they can have there.
+        :param a: Car to swap, or None for a random placed car
+        :param b: Car to swap, or None for a random placed car
+        :return: bool: Has a change been made?
+        """
+        if a is None:
+            a = self.car_zone.random_key()
+        if b is None:
+            b = self.car_zone.random_key()
+        if a not in self.car_zone or b not in self.car_zone:
+            return False
+        zone_a = self.car_zone[a]
+        zone_b = self.car_zone[b]
+        if zone_a is zone_b:
+            return False
+
+        self._remove_car(a)
+        self._remove_car(b)
+        self._place_car(a, zone_b)
+        self._place_car(b, zone_a)
+        self.reschedule([a, b])
+        return True
 
     def move_to_neighbour(self, req: Request = None) -> bool:
         """
@@ -182,28 +692,24 @@ class Solution:
         # Current data
         current_car = self.req_car[req]
         current_zone = self.car_zone[current_car]
-        assigned_cars = self.car_zone
-
-        # Make a list of all cars the request can be assigned to, excluding our current and excluding any unassigned cars
-        possible_cars = filter(lambda c: c != current_car and c in assigned_cars, req.vehicles)
-
-        # Set of acceptable zones based on the conditions:                    Ignore same zone, Don't move to own zone, Zone must be a neighbour.
-        allowed_zones = {z for z in {self.car_zone[c] for c in possible_cars} if z != current_zone and z != req.zone and z.id in req.zone.neighbours}
-        # If there are no acceptable zones, quit
-        if len(allowed_zones) == 0:
-            return False
+        car_zone = self.car_zone
+        # Never the request's own zone
+        neighbours = req.zone.neighbours
 
-        # Now filter out cars that are not assigned to one of those zones or that would result in overlap
-        possible_cars = filter(lambda c: self.car_zone[c] in allowed_zones and not self.check_overlap_car_request(c, req), possible_cars)
+        # All cars of the request in another neighbour zone (so not the current car) that would not result in overlap.
+        possible_cars = []
+        for car in req.vehicles:
+            zone = car_zone.get(car)
+            if zone is not None and zone is not current_zone and zone in neighbours and not self.check_overlap_car_request(car, req):
+                possible_cars.append(car)
 
-        possible_cars = tuple(possible_cars)
-        if len(possible_cars) == 0:
+        if not possible_cars:
             return False
 
         picked_car = self.problem.rng.choice(possible_cars)
         # logging.info('possible_cars: Picked %r out of %r', picked_car, possible_cars)
 
-        self.req_car[req] = picked_car
+        self._assign(req, picked_car)
         self.greedy_assign()
         return True
 
@@ -223,20 +729,19 @@ class Solution:
         current_zone = self.car_zone[current_car]
 
         # Check if request is already in the right zone
-        if current_zone == req.zone:
+        if current_zone is req.zone:
             return False
 
-        # Check if other cars are available in the right zone
+        # Check if other cars are available in the right zone (so never the current car)
+        car_zone = self.car_zone
         for car in req.vehicles:
-            if car != current_car:
-                # Check if the car has a zone, and this zone is the right zone
-                if car in self.car_zone and self.car_zone[car] == req.zone:
-                    # Check for overlap with the new car and the request
-                    if not self.check_overlap_car_request(car, req):
-                        # This car is suitable as a replacement
-                        self.req_car[req] = car
-                        self.greedy_assign()
-                        return True
+            if car_zone.get(car) is req.zone:
+                # Check for overlap with the new car and the request
+                if not self.check_overlap_car_request(car, req):
+                    # This car is suitable as a replacement
+                    self._assign(req, car)
+                    self.greedy_assign()
+                    return True
 
         return False
 
@@ -255,14 +760,15 @@ class Solution:
         current_car = self.req_car[req]
         current_zone = self.car_zone[current_car]
 
+        car_zone = self.car_zone
         for car in req.vehicles:
             if car != current_car:
                 # Check if the car has a zone, and this zone is the current zone
-                if car in self.car_zone and self.car_zone[car] == current_zone:
+                if car_zone.get(car) is current_zone:
                     # Check for overlap with the new car and the request
                     if not self.check_overlap_car_request(car, req):
                         # This car is suitable as a replacement
-                        self.req_car[req] = car
+                        self._assign(req, car)
                         self.greedy_assign()
                         return True
 
@@ -280,7 +786,7 @@ class Solution:
             # Request is not assigned.
             return False
 
-        del self.req_car[req]
+        self._unassign(req)
         self.greedy_assign()
 
         return True
@@ -297,9 +803,7 @@ class Solution:
             # Car is not assigned.
             return False
 
-        del self.car_zone[car]
-
-        self.req_car.delete_by_value(car)
+        self._remove_car(car)
 
         self.greedy_assign()
 
@@ -0,0 +1,112 @@
+"""
+    Parallel tempering (replica exchange) between worker processes.
+
+    Every worker holds one replica of the problem at a fixed temperature, from hot (replica 0) to cold (last replica).
+    Every few iterations adjacent replicas propose to swap their solutions, so good solutions found at a high
+    temperature can sink down to the cold replicas, and cold replicas that got stuck can be heated up again.
+    The messages are only a cost and an encoded solution (2 int arrays).
+"""
+import math
+import time
+from multiprocessing.connection import Connection
+from typing import List, Optional
+
+from CarSharing.Problem import Problem, get_from_env_or_default, t_max, t_min
+from CarSharing.Solution import Solution
+
+# Iterations between swap proposals
+exchange_interval = get_from_env_or_default('PT_EXCHANGE', 1000)
+
+
+def temperatures(n: int) -> List[float]:
+    """
+    Geometric temperature ladder from t_max (replica 0) down to t_min (replica n - 1).
+    """
+    if n == 1:
+        return [t_min]
+    return [t_max * (t_min / t_max) ** (k / (n - 1)) for k in range(n)]
+
+
+class Replica:
+    """
+    One replica: a Problem at a fixed temperature, with pipes to its hotter (lower) and colder (upper) neighbour.
+    """
+
+    def __init__(self, i: int, problem: Problem, temp: float, lower: Optional[Connection], upper: Optional[Connection]):
+        self.i = i
+        self.problem = problem
+        self.temp = temp
+        self.lower = lower
+        self.upper = upper
+        self.rounds = 0
+        self.swaps = 0
+
+    def __repr__(self):
+        return 'Replica<{}, T: {:g}, rounds: {}, swaps: {}>'.format(self.i, self.temp, self.rounds, self.swaps)
+
+    def run(self, debug):
+        """
+        Anneal at the fixed temperature and exchange with the neighbours, until interrupted or past the deadline.
+        """
+        self.problem.start(debug)
+        while True:
+            for x in range(exchange_interval):
+                self.problem.step(self.temp, debug)
+            self.problem.metrics.step(self.temp, self.problem.iterations, sum(self.problem.operators.accepted))
+            self.exchange()
+
+    def exchange(self):
+        """
+        In even rounds replica pairs (0, 1), (2, 3), ... exchange, in odd rounds (1, 2), (3, 4), ...
+        The hotter replica of a pair decides, the colder one sends its solution first and waits for the answer.
+        """
+        parity = self.rounds % 2
+        self.rounds += 1
+        current = self.problem.current
+
+        if self.i % 2 == parity:
+            if self.upper is None:
+                return
+            cost, encoded, temp = self.recv(self.upper)
+            # Metropolis criterion for swapping 2 replicas: min(1, exp((1/T_i - 1/T_j) * (E_i - E_j)))
+            delta = (1 / self.temp - 1 / temp) * (current.cost - cost)
+            if delta >= 0 or math.exp(delta) > self.problem.rng.random():
+                self.upper.send(current.encode())
+                self.adopt(encoded)
+            else:
+                self.upper.send(None)
+        else:
+            if self.lower is None:
+                return
+            self.lower.send((current.cost, current.encode(), self.temp))
+            encoded = self.recv(self.lower)
+            if encoded is not None:
+                self.adopt(encoded)
+
+    def recv(self, conn: Connection):
+        """
+        Wait for the other replica, but not past the deadline: it might have stopped already.
+        """
+        deadline = self.problem.deadline
+        if deadline is not None and not conn.poll(max(0.0, deadline - time.monotonic())):
+            raise TimeoutError('Deadline reached while waiting for replica exchange')
+        return conn.recv()
+
+    def adopt(self, encoded):
+        """
+        Continue from the solution of the other replica.
+        """
+        self.swaps += 1
+        self.problem.accept(Solution.decode(self.problem, *encoded))
+
+    @classmethod
+    def create(cls, i: int, n: int, problem: Problem, pipes) -> 'Replica':
+        """
+        :param i: replica number (0 = hottest)
+        :param n: amount of replicas
+        :param problem: the problem this replica works on
+        :param pipes: n - 1 (a, b) connection pairs, pipe k connects replica k (end a) with replica k + 1 (end b)
+        """
+        lower = pipes[i - 1][1] if i > 0 else None
+        upper = pipes[i][0] if i < n - 1 else None
+        return cls(i, problem, temperatures(n)[i], lower, upper)
@@ -0,0 +1,82 @@
+"""
+    Convergence trace of a worker: the cost of the current solution, streamed to a CSV file while running.
+
+    Downsampled to buckets of `bucket` iterations, every bucket is one line with the min, max and last cost in it.
+    Memory use doesn't depend on the length of the run, only the current bucket is kept.
+
+    File format (with header): iteration,run,min,max,last
+        iteration   The worker's iteration count at the start of the bucket (continues over restarts)
+        run         Run number (restart) of the worker, from 1
+"""
+from typing import Optional
+
+import numpy as np
+
+
+class Trace:
+    def __init__(self, path: str, bucket: int):
+        """
+        :param path: File to write to, only opened at the first run. So this can be passed to a worker process.
+        :param bucket: Iterations per line
+        """
+        self.path = path
+        self.bucket = bucket
+        self.file = None
+        self.iteration = 0
+        self.run = 0
+
+        # Current bucket
+        self.n = 0
+        self.low = None
+        self.high = None
+        self.last = None
+
+    def __repr__(self):
+        return 'Trace<{}, run: {}, iteration: {}>'.format(self.path, self.run, self.iteration + self.n)
+
+    def new_run(self, cost: int):
+        """
+        Start of a run (restart), with the cost of the initial solution.
+        """
+        self.flush()
+        if self.file is None:
+            self.file = open(self.path, 'w')
+            print('iteration', 'run', 'min', 'max', 'last', sep=',', file=self.file)
+        self.run += 1
+        self.add(cost)
+
+    def add(self, cost: int):
+        if self.n:
+            if cost < self.low:
+                self.low = cost
+            elif cost > self.high:
+                self.high = cost
+        else:
+            self.low = self.high = cost
+        self.last = cost
+        self.n += 1
+        if self.n >= self.bucket:
+            self.flush()
+
+    def flush(self):
+        if self.n:
+            print(self.iteration, self.run, self.low, self.high, self.last, sep=',', file=self.file)
+            self.iteration += self.n
+            self.n = 0
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read(path: str) -> Optional[np.ndarray]:
+    """
+    :return: The trace in the file as int array with columns iteration, run, min, max, last. None if there is no file.
+    """
+    try:
+        data = np.loadtxt(path, delimiter=',', skiprows=1, dtype=np.int64, ndmin=2)
+    except OSError:
+        return None
+    return data
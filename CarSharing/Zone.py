@@ -1,14 +1,40 @@
-from typing import Set
+import sys
+from typing import FrozenSet, List
 
 
 class Zone:
-    def __init__(self, id: str, neighbours: str):
+    __slots__ = ('id', 'neighbour_ids', 'index', 'neighbours', 'feasible')
+
+    def __init__(self, id: str, neighbours: str, index: int):
         self.id: str = id
-        self.neighbours: Set[str] = set(neighbours.split(","))
+        self.neighbour_ids: FrozenSet[str] = frozenset(map(sys.intern, neighbours.split(",")))
+        self.index: int = index  # index in the zones list and the numpy matrices
+        # Set by link(), once all zones exist:
+        # The zones a car can be in to serve a request in this zone as neighbour (penalty2), so not this zone itself.
+        self.neighbours: FrozenSet['Zone'] = frozenset()
+        # The zones a car can be in to serve a request in this zone at all: this zone and its neighbours.
+        self.feasible: FrozenSet['Zone'] = frozenset((self,))
 
     def __repr__(self):
-        return 'Zone<id: {!r}, neighbours: {!r}>'.format(self.id, self.neighbours)
+        return 'Zone<id: {!r}, neighbours: {!r}>'.format(self.id, self.neighbour_ids)
 
     def check(self, zone_id: str):
         """ Check if given zone matches or is a neighbour  """
-        return zone_id == self.id or zone_id in self.neighbours
+        return zone_id == self.id or zone_id in self.neighbour_ids
+
+
+def link(zones: List[Zone]):
+    """
+    Fill in neighbours & feasible of all zones. Like the cost, a car in zone z serves a request as neighbour if the
+    request's zone is in z.neighbour_ids (for the symmetric course material instances, that's just the neighbour_ids).
+    """
+    zone_map = {zone.id: zone for zone in zones}
+    served = {zone: [] for zone in zones}
+    for car_zone in zones:
+        for zone_id in car_zone.neighbour_ids:
+            zone = zone_map.get(zone_id)
+            if zone is not None and zone is not car_zone:
+                served[zone].append(car_zone)
+    for zone in zones:
+        zone.neighbours = frozenset(served[zone])
+        zone.feasible = zone.neighbours | {zone}
@@ -1,11 +1,10 @@
 import argparse
+import json
 import logging
 import multiprocessing as mp
 import os
 import random
 import signal
-import subprocess as sp
-import tempfile
 import time
 
 # Yey circular imports
@@ -14,10 +13,27 @@ NO_SHOW = 'NO_SHOW' in os.environ
 logging.basicConfig(level=logging.DEBUG if DEBUG else logging.INFO, format='%(asctime)s [%(name)s %(levelname)s] %(message)s', datefmt='%H:%M:%S')
 
 
-from CarSharing.Problem import Problem
+from CarSharing.Board import Board
+from CarSharing.Metrics import Metrics, merge
+from CarSharing.Operators import ENGINES
+from CarSharing.Problem import Problem, get_from_env_or_default
+from CarSharing.Schedule import Schedule
+from CarSharing.Solution import Solution
+from CarSharing.Tempering import Replica
+from CarSharing.Trace import Trace, read as read_trace
 from CarSharing.input_parser import parse_input
+from CarSharing import cache, decompose, validator
 
 
+# Start every restart after the first one from the best solution on the shared board, instead of from scratch.
+board_restart = bool(get_from_env_or_default('BOARD_RESTART', 1))
+# Anytime mode: Seconds reserved at the end of the runtime for the last write of the output.
+anytime_margin = get_from_env_or_default('ANYTIME_MARGIN', 0.25, type_=float)
+# Anytime mode: Seconds between checks of the board for a new best.
+anytime_poll = get_from_env_or_default('ANYTIME_POLL', 0.1, type_=float)
+# Debug mode: Iterations per line of the convergence traces (see Trace).
+trace_bucket = get_from_env_or_default('TRACE_BUCKET', 100)
+
 parser = argparse.ArgumentParser()
 
 parser.add_argument('input', help='The input file to parse')
@@ -25,22 +41,33 @@ parser.add_argument('output', help='The output file')
 parser.add_argument('runtime', type=int, default=0, help='Max runtime in seconds.', nargs='?')
 parser.add_argument('seed', type=int, default=0, help='A seed for the RNG', nargs='?')
 parser.add_argument('threads', type=int, default=1, help='Max number of threads.', nargs='?')
-
-
-def validate(input_filename: str, output_filename: str):
+parser.add_argument('--mode', choices=('restarts', 'tempering'), default='restarts',
+                    help='restarts: independent SA restarts per thread. tempering: one replica per thread, exchanging solutions.')
+parser.add_argument('--engine', choices=tuple(ENGINES), default='sa',
+                    help='sa: small moves, every one followed by a greedy repair. lns: Large Neighbourhood Search, destroy a zone, time window or some cars and repair by regret insertion. zones: only move cars between zones, every moved car gets the best schedule it can have there.')
+parser.add_argument('--anytime', action='store_true',
+                    help='Keep the best solution on disk at all times, and let the workers stop by themselves at the deadline.')
+parser.add_argument('--no-cache', action='store_true',
+                    help='Always parse the input, instead of using (or making) a cache entry for it, see CarSharing.cache')
+parser.add_argument('--no-decompose', action='store_true',
+                    help='Always solve the instance as a whole, instead of its independent parts separately, see CarSharing.decompose')
+parser.add_argument('--metrics', metavar='PREFIX',
+                    help='Write the metrics of every worker to PREFIX.<job>.jsonl, and the merged summary to PREFIX.summary.json')
+
+
+def validate(inp, output_filename: str):
     logging.info('Verified output')
     logging.info('---------------')
-    args = ('java', '-jar', 'validator.jar', input_filename, output_filename)
-    p = sp.Popen(args, stdout=sp.PIPE, stderr=sp.STDOUT, universal_newlines=True)
-    while True:
-        line = p.stdout.readline()
-        if line == '':
-            break
-        logging.info(line.rstrip())
+    for line in validator.validate(inp[-1], output_filename).lines():
+        logging.info(line)
     logging.info('---------------')
 
 
-def create_stats_graph(filename, best_cost, results):
+def create_stats_graph(filename, best_cost, traces):
+    """
+    Plot the convergence traces: the band is the min & max per bucket, the line the last value.
+    :param traces: (name, path) of the trace files
+    """
     if NO_SHOW:
         import matplotlib as mpl
         mpl.use('Agg')
@@ -50,10 +77,14 @@ def create_stats_graph(filename, best_cost, results):
     plt.xlabel('Iterations')
     plt.ylabel('Cost')
 
-    with open(filename + '.stats.csv', 'a') as f:
-        for score, name, stats in results:
-            print(name, *stats, sep=',', file=f)
-            plt.plot(stats)
+    for name, path in traces:
+        data = read_trace(path)
+        if data is None:
+            continue
+        iteration, run, low, high, last = data.T
+        line, = plt.plot(iteration, last, label=name, linewidth=0.5)
+        plt.fill_between(iteration, low, high, color=line.get_color(), alpha=0.3, linewidth=0)
+    plt.legend()
 
     plt.tight_layout()
     plt.autoscale()
@@ -69,75 +100,195 @@ def single_thead_debug_run(args, rng, inp):
 
     signal.signal(signal.SIGALRM, interrupt)
     signal.alarm(args.runtime)
+    schedule = Schedule.create(time.monotonic() + args.runtime if args.runtime > 0 else None, args.engine)
+    logging.debug('Cooling: %r', schedule)
 
     start = time.perf_counter()
     total_iterations = 0
     results = []
+    metrics = Metrics(0, path=metrics_path(args.metrics, 0))
+    trace = Trace(trace_path(args.output, 0), trace_bucket)
     try:
         aborted = False
         while not aborted:
             start_i = time.perf_counter()
-            problem = Problem(0, random.Random(rng.random()), *inp)
-            iterations, stats, aborted = problem.run(DEBUG)
+            problem = Problem(0, random.Random(rng.random()), *inp, engine=args.engine)
+            problem.metrics = metrics
+            problem.trace = trace
+            iterations, aborted = problem.run(DEBUG, schedule)
+            # Right away, the alarm can go off while logging when the timed schedule ends at the same moment.
+            total_iterations += iterations
+            results.append((problem.solution.cost, problem))
             runtime = time.perf_counter() - start_i
             problem.log.debug('Time: %r for %d iterations -> %d Hz Cost: %d', runtime, iterations, iterations / runtime, problem.solution.cost)
-            total_iterations += iterations
-            results.append((problem.solution.cost, stats, problem))
+            problem.operators.log(problem.log)
     except (KeyboardInterrupt, TimeoutError):
         pass
+    # The timed schedule can be done before the alarm.
+    signal.alarm(0)
 
     runtime = time.perf_counter() - start
     logging.debug('Global runtime: %r for %d iterations -> %d Hz', runtime, total_iterations, total_iterations / runtime)
     results.sort(key=lambda x: x[0])
 
     with open(args.output, 'w') as f:
-        results[0][2].save(f)
+        results[0][1].save(f)
 
-    results = [(cost, args.output, stats) for cost, stats, problem in results]
-    create_stats_graph(args.output, results[0][0], results)
+    trace.close()
+    write_metrics(args.metrics, [metrics.close()])
+    create_stats_graph(args.output, results[0][0], [(args.output, trace.path)])
 
 
-def proc_main(queue: mp.Queue, i, root, rng, inp):
+def proc_main(queue: mp.Queue, i, rng, source, engine, board: Board, deadline, schedule: Schedule, metrics: Metrics, trace: Trace):
     """
     Main function for subprocess
     :param queue: Pass values back to master
     :param i: thread/job number
-    :param root: Root folder
     :param rng: RNG number to be used as seed
-    :param inp: The input arguments for Problem as tuple
+    :param source: The cache entry of the input (memory mapped by the worker), or the input arguments for Problem as tuple
+    :param engine: The moves of the runs, see Operators.ENGINES
+    :param board: Shared best solution board, every new best is published to it
+    :param deadline: time.monotonic() value to stop at, or None to run until interrupted
+    :param schedule: Cooling schedule for the runs
+    :param metrics: Metrics of this worker, for all runs together
+    :param trace: Convergence trace of this worker, for all runs together. None to not keep one.
     """
+    inp = cache.resolve(source)
     proc_best_score = None
-    proc_best_instance = None
-    proc_best_stats = None
     try:
         aborted = False
         while not aborted:
-            problem = Problem(i, random.Random(rng), *inp)
+            problem = Problem(i, random.Random(rng), *inp, engine=engine)
+            problem.board = board
+            problem.deadline = deadline
+            problem.metrics = metrics
+            problem.trace = trace
             rng += 1
+            # Reheat from the global best, except the first time, so not every worker starts from the same solution.
+            initial = board.load(problem) if board_restart and proc_best_score is not None else None
             start = time.perf_counter()
-            iterations, stats, aborted = problem.run(DEBUG)
+            iterations, aborted = problem.run(DEBUG, schedule, initial)
             runtime = time.perf_counter() - start
             problem.log.debug('Time: %r for %d iterations -> %d Hz Cost: %d', runtime, iterations, iterations / runtime, problem.solution.cost)
+            problem.operators.log(problem.log)
 
             if proc_best_score is None or problem.solution.cost < proc_best_score:
                 problem.log.debug('New best run with cost: %d', problem.solution.cost)
                 proc_best_score = problem.solution.cost
-                proc_best_instance = problem
-                proc_best_stats = stats
     except (KeyboardInterrupt, TimeoutError):
         pass
 
-    # Store the result to a tmp file. If it's the best, it will get moved/renamed by the main thread.
-    # This is such a filthy hack, but it works. Passing back the whole problem/solution obj does not.
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, dir=root, prefix='tmp-', suffix='.csv') as f:
-        proc_best_instance.save(f)
-    queue.put((proc_best_score, f.name, proc_best_stats))
+    if trace is not None:
+        trace.close()
+    queue.put((proc_best_score, 'JOB %d' % i, metrics.close()))
+
+
+def proc_tempering(queue: mp.Queue, i, replica, n, rng, source, engine, board: Board, deadline, pipes, metrics: Metrics, trace: Trace):
+    """
+    Main function for subprocess in parallel tempering mode
+    :param queue: Pass values back to master
+    :param i: thread/job number
+    :param replica: replica number, from hot to cold
+    :param n: amount of replicas
+    :param rng: RNG number to be used as seed
+    :param source: The cache entry of the input (memory mapped by the worker), or the input arguments for Problem as tuple
+    :param engine: The moves of the runs, see Operators.ENGINES
+    :param board: Shared best solution board, every new best is published to it
+    :param deadline: time.monotonic() value to stop at, or None to run until interrupted
+    :param pipes: The pipes between the replicas, see Replica.create
+    :param metrics: Metrics of this worker
+    :param trace: Convergence trace of this worker, None to not keep one.
+    """
+    replica = Replica.create(replica, n, Problem(i, random.Random(rng), *cache.resolve(source), engine=engine), pipes)
+    problem = replica.problem
+    problem.board = board
+    problem.deadline = deadline
+    problem.metrics = metrics
+    problem.trace = trace
+    start = time.perf_counter()
+    try:
+        replica.run(DEBUG)
+    except (KeyboardInterrupt, TimeoutError):
+        pass
+    # A replica only stops when it's interrupted or past the deadline.
+    problem.run_finished(replica.temp, True)
+    runtime = time.perf_counter() - start
+    problem.log.debug('%r: Time: %r for %d iterations -> %d Hz Cost: %d', replica, runtime, problem.iterations, problem.iterations / runtime, problem.best_cost)
+    problem.operators.log(problem.log)
+
+    if trace is not None:
+        trace.close()
+    queue.put((problem.best_cost, 'JOB %d' % i, metrics.close()))
+
+
+def trace_path(output, i):
+    return '%s.trace.%d.csv' % (output, i)
+
+
+def metrics_path(prefix, i):
+    return None if prefix is None else '%s.%d.jsonl' % (prefix, i)
+
+
+def write_metrics(prefix, summaries):
+    """
+    Log the merged metrics of all workers, and write them to PREFIX.summary.json
+    """
+    summary = merge(summaries)
+    logging.info('Metrics: %d iterations in %d runs, %d Hz per worker, %.1f%% accepted',
+                 summary['counters']['iterations'], summary['counters']['runs'], summary['iterations_per_second'], 100 * summary['acceptance'])
+    for name, timer in summary['timers'].items():
+        logging.info('Metrics: %s: %d calls, mean %.1f µs, p99 < %d µs', name, timer['count'], timer['mean_us'], timer['p99_us'])
+    if prefix is not None:
+        with open(prefix + '.summary.json', 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+def write_best(problem: Problem, board: Board, filename: str) -> (int, int):
+    """
+    Write the best solution on the board to the file, atomically: write to a tmp file first, then rename it.
+    :return: (version, cost) of what has been written
+    """
+    version, cost, assignment, placement = board.read()
+    problem.solution = Solution.decode(problem, assignment, placement)
+    tmp = filename + '.tmp'
+    with open(tmp, 'w') as f:
+        problem.save(f)
+    os.replace(tmp, filename)
+    if DEBUG:
+        report = validator.validate(problem.model, filename)
+        if not report.valid:
+            problem.log.error('Checkpoint %d is not valid: %s', version, '; '.join(report.errors))
+    return version, cost
+
+
+def anytime(problem: Problem, board: Board, filename: str, deadline) -> int:
+    """
+    Keep the output file up to date with the best solution on the board until the deadline (or ctrl+c if there is none).
+    Only writes if there is a new best, at most once per anytime_poll seconds.
+    :return: The cost of the final solution
+    """
+    version, cost = 0, None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(anytime_poll if deadline is None else max(0.0, min(anytime_poll, deadline - time.monotonic())))
+            if board.version != version:
+                version, cost = write_best(problem, board, filename)
+    except KeyboardInterrupt:
+        pass
+    # Only empty if the runtime is shorter than the first greedy_assign.
+    while board.version == 0:
+        time.sleep(0.01)
+    if board.version != version:
+        version, cost = write_best(problem, board, filename)
+    return cost
 
 
 def main():
     # Start times
     start = time.perf_counter()
     global_start = start
+    # Same moment, but on the clock all processes share for the deadline.
+    monotonic_start = time.monotonic()
 
     # Parsing input is a done once, because it's common anyway.
     logging.info('Parsing input...')
@@ -147,7 +298,11 @@ def main():
     root = os.path.dirname(os.path.abspath(args.output))
     logging.info('Working & output dir: %r', root)
     rng = random.Random(args.seed) if args.seed != 0 else random.Random()
-    inp = parse_input(args.input, False)
+    # Skip the parsing if there is a cache entry for this input already, and let the workers memory map it.
+    source = None if args.no_cache else cache.prepare(args.input)
+    inp = parse_input(args.input, False) if source is None else cache.load(source)
+    if source is None:
+        source = inp
 
     # For performance profiling ONLY, it can't use multiple processes.
     # This could be used if the threads parameter was 1 EXCEPT it doesn't write the file in time.
@@ -155,10 +310,41 @@ def main():
         single_thead_debug_run(args, rng, inp)
         return
 
-    # The queue is used to pass back values to the mail thread.
+    # The queue is used to pass back stats to the mail thread.
     queue = mp.Queue()
-    # Setup workers
-    procs = [mp.Process(target=proc_main, args=(queue, i, root, rng.random(), inp)) for i in range(args.threads)]
+    # Independent parts of the instance are solved separately, every part with its own workers.
+    parts = [decompose.whole(inp, args.threads)] if args.no_decompose else decompose.split(inp, args.threads)
+    if len(parts) > 1:
+        logging.info('Decomposed into %d parts: %r', len(parts), parts)
+    sources = [source] if len(parts) == 1 else [part.inp for part in parts]
+    # The board is used to share the best solution between all workers (of a part) and the main thread.
+    boards = [Board.create(part.inp[-1]) for part in parts]
+    board = boards[0] if len(parts) == 1 else decompose.MergedBoard(inp[-1], parts, boards)
+    # In anytime mode, the workers stop by themselves at the deadline. Otherwise they get interrupted.
+    deadline = monotonic_start + args.runtime - anytime_margin if args.anytime and args.runtime > 0 else None
+    # The cooling ends when the workers have to stop. Without a deadline that's when they get interrupted (see below).
+    if args.runtime <= 0:
+        schedule = Schedule.create(None, args.engine)
+    elif args.anytime:
+        schedule = Schedule.create(deadline, args.engine)
+    else:
+        schedule = Schedule.create(monotonic_start + args.runtime - 4 * (time.perf_counter() - start), args.engine)
+    logging.debug('Cooling: %r', schedule)
+    # Metrics per worker, merged at the end.
+    metrics = [Metrics(i, monotonic_start, metrics_path(args.metrics, i)) for i in range(args.threads)]
+    # Convergence traces per worker, only in debug mode.
+    traces = [Trace(trace_path(args.output, i), trace_bucket) if DEBUG else None for i in range(args.threads)]
+    # Setup workers, the job numbers continue over the parts.
+    procs = []
+    for part, part_source, part_board in zip(parts, sources, boards):
+        jobs = range(len(procs), len(procs) + part.workers)
+        if args.mode == 'tempering':
+            pipes = [mp.Pipe() for _ in range(part.workers - 1)]
+            procs.extend(mp.Process(target=proc_tempering, args=(queue, i, k, part.workers, rng.random(), part_source, args.engine, part_board, deadline, pipes, metrics[i], traces[i])) for k, i in enumerate(jobs))
+        else:
+            procs.extend(mp.Process(target=proc_main, args=(queue, i, rng.random(), part_source, args.engine, part_board, deadline, schedule, metrics[i], traces[i])) for i in jobs)
+    # Not a worker, the problem is only used to rebuild the solution from the board.
+    problem = Problem(-1, rng, *inp)
 
     # post-Start, pre-Compute times
     end = time.perf_counter()
@@ -170,34 +356,46 @@ def main():
     for p in procs:
         p.start()
 
-    # Keep some time to save the best result. Saving should be comparable to the starting up.
-    sleep_time = args.runtime - 4 * startup_time
-    logging.info('Target compute time: %r', sleep_time)
-    # Sleep until workers need to die.
-    if sleep_time < 0:
-        sleep_time = 60*60*24*356.25*10  # See you in 10 years...
-    try:
-        time.sleep(sleep_time)
-    except (KeyboardInterrupt, TimeoutError):
-        pass
-
-    # Tell workers to die (sigint = ctrl+c = KeyboardInterrupt = good because of try-except)
-    for p in procs:
-        os.kill(p.pid, signal.SIGINT)
-
-    # post-Compute, pre-Save times
-    end = time.perf_counter()
-    compute_time = end - start
-    logging.info('Effective compute time: %r', compute_time)
-    start = end
-
-    # Wait for threads to clean up after themselves and pass back the results
-    results = [queue.get() for _ in procs]
-
-    # Get the best result
-    best_cost, best_filename, best_stats = min(results, key=lambda x: x[0])
-    # Rename the file to the proper output name
-    os.replace(best_filename, args.output)
+    if args.anytime:
+        logging.info('Target compute time: %r', None if deadline is None else deadline - time.monotonic())
+        best_cost = anytime(problem, board, args.output, deadline)
+
+        # post-Compute times. Saving happened all along, only the last write is after the deadline.
+        end = time.perf_counter()
+        compute_time = end - start
+        logging.info('Effective compute time: %r', compute_time)
+        start = end
+    else:
+        # Keep some time to save the best result. Saving should be comparable to the starting up.
+        sleep_time = args.runtime - 4 * startup_time
+        logging.info('Target compute time: %r', sleep_time)
+        # Sleep until workers need to die.
+        if sleep_time < 0:
+            sleep_time = 60*60*24*356.25*10  # See you in 10 years...
+        try:
+            time.sleep(sleep_time)
+        except (KeyboardInterrupt, TimeoutError):
+            pass
+
+        # Read the best solution straight from the board. Only empty if the runtime is shorter than the first greedy_assign.
+        while board.version == 0:
+            time.sleep(0.01)
+        best = board.read()
+
+        # Tell workers to die (sigint = ctrl+c = KeyboardInterrupt = good because of try-except)
+        for p in procs:
+            os.kill(p.pid, signal.SIGINT)
+
+        # post-Compute, pre-Save times
+        end = time.perf_counter()
+        compute_time = end - start
+        logging.info('Effective compute time: %r', compute_time)
+        start = end
+
+        version, best_cost, assignment, placement = best
+        problem.solution = Solution.decode(problem, assignment, placement)
+        with open(args.output, 'w') as f:
+            problem.save(f)
 
     # post-Save & total times
     end = time.perf_counter()
@@ -209,16 +407,18 @@ def main():
     # No longer counts for time, just some stats/plots, and cleanup :)
     # ================================================================
 
-    # Cleanup, technically not required, so not counted towards the timers.
-    for result, filename, stats in results:
-        # Already moved.
-        if filename != best_filename:
-            os.unlink(filename)
+    # Wait for threads to clean up after themselves and pass back the stats
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    board.close()
+    board.unlink()
+    write_metrics(args.metrics, [summary for score, name, summary in results])
 
-    validate(args.input, args.output)
+    validate(inp, args.output)
 
     if DEBUG:
-        create_stats_graph(args.input, best_cost, results)
+        create_stats_graph(args.input, best_cost, [('JOB %d' % i, trace.path) for i, trace in enumerate(traces)])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,158 @@
+"""
+    On-disk cache of parsed instances, so repeated runs on the same input skip parsing and the overlap construction.
+
+    A cache entry is a directory named after the SHA-256 of the input file and the cache format version, with:
+        meta.json   The strings (ids of requests, zones, cars & the zone neighbours), days and the overlap type
+        *.npy       The arrays of the Model and the Overlap, loaded with mmap so the workers share the pages
+    Entries are written to a tmp directory first and then renamed, so a half written entry is never used.
+
+    Workers get the path of the entry instead of a pickled copy of the parsed input, see resolve().
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+from typing import Optional
+
+import numpy as np
+
+from CarSharing.Model import Model
+from CarSharing.Overlap import DenseOverlap, SparseOverlap
+from CarSharing.Problem import get_from_env_or_default
+from CarSharing.Request import Request
+from CarSharing.Zone import Zone, link
+from CarSharing.input_parser import parse_input, sparse_threshold
+
+# Bump when the layout of an entry changes, old entries are then simply not found anymore.
+VERSION = 1
+
+# Where the entries go, default a .cache directory next to the input file.
+cache_dir = get_from_env_or_default('CACHE_DIR', None, type_=str)
+
+MODEL_ARRAYS = ('adjacency', 'req_zone', 'req_day', 'req_start', 'req_end', 'penalty1', 'penalty2', 'vehicles_indptr', 'vehicles')
+
+log = logging.getLogger('cache')
+
+
+def file_hash(filename: str) -> str:
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def entry_path(filename: str) -> str:
+    root = cache_dir if cache_dir is not None else os.path.join(os.path.dirname(os.path.abspath(filename)), '.cache')
+    return os.path.join(root, '%s-v%d' % (file_hash(filename), VERSION))
+
+
+def save(path: str, inp):
+    """
+    Write the parsed input (as returned by parse_input) to a cache entry.
+    """
+    requests, request_map, zones, zone_map, vehicles, days, overlap, model = inp
+    tmp = '%s.tmp%d' % (path, os.getpid())
+    os.makedirs(tmp)
+    try:
+        for name in MODEL_ARRAYS:
+            np.save(os.path.join(tmp, name + '.npy'), getattr(model, name))
+        sparse = isinstance(overlap, SparseOverlap)
+        if sparse:
+            np.save(os.path.join(tmp, 'overlap_indptr.npy'), overlap.indptr)
+            np.save(os.path.join(tmp, 'overlap_indices.npy'), overlap.indices)
+        else:
+            np.save(os.path.join(tmp, 'overlap_matrix.npy'), overlap.matrix)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({
+                'version': VERSION,
+                'days': days,
+                'sparse': sparse,
+                'req_ids': model.req_ids,
+                'car_ids': model.car_ids,
+                'zone_ids': model.zone_ids,
+                'zone_neighbours': [sorted(zone.neighbour_ids) for zone in zones],
+            }, f)
+        os.replace(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        # Someone else was first, that's fine.
+        if not os.path.isdir(path):
+            raise
+
+
+def load(path: str, mmap: bool = True):
+    """
+    Read a cache entry, in the same form as parse_input returns.
+    :param mmap: Memory map the arrays (read only) instead of reading them.
+    """
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    mode = 'r' if mmap else None
+
+    def array(name):
+        # A plain ndarray view on the mmap, indexing a np.memmap goes through a slow Python level __getitem__.
+        return np.load(os.path.join(path, name + '.npy'), mmap_mode=mode).view(np.ndarray)
+
+    car_ids = [sys.intern(car) for car in meta['car_ids']]
+    model = Model(meta['req_ids'], car_ids, meta['zone_ids'], **{name: array(name) for name in MODEL_ARRAYS})
+
+    zones = [Zone(zone_id, ','.join(neighbours), i) for i, (zone_id, neighbours) in enumerate(zip(meta['zone_ids'], meta['zone_neighbours']))]
+    zone_map = {zone.id: zone for zone in zones}
+    link(zones)
+
+    # The same Request objects as parse_input makes, rebuilt from the columns.
+    indptr = model.vehicles_indptr.tolist()
+    vehicles = model.vehicles.tolist()
+    days = model.req_day.tolist()
+    starts = model.req_start.tolist()
+    ends = model.req_end.tolist()
+    penalty1 = model.penalty1.tolist()
+    penalty2 = model.penalty2.tolist()
+    requests = []
+    for i, (req_id, zone) in enumerate(zip(model.req_ids, model.req_zone.tolist())):
+        start = starts[i] - days[i] * 24 * 60
+        cars = ','.join(car_ids[car] for car in vehicles[indptr[i]:indptr[i + 1]])
+        request = Request(req_id, zones[zone], days[i], start, ends[i] - starts[i], cars, penalty1[i], penalty2[i], i)
+        requests.append(request)
+    request_map = {req.id: req for req in requests}
+
+    if meta['sparse']:
+        overlap = SparseOverlap(array('overlap_indptr'), array('overlap_indices'), starts, ends)
+    else:
+        overlap = DenseOverlap(array('overlap_matrix'))
+
+    return requests, request_map, zones, zone_map, car_ids, meta['days'], overlap, model
+
+
+def prepare(filename: str) -> Optional[str]:
+    """
+    Make sure there is an up to date cache entry for this input file.
+    :return: The path of the entry, or None if it can't be written (then parse the input without cache).
+    """
+    path = entry_path(filename)
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        # The overlap type depends on the threshold, that can change between runs.
+        if meta['sparse'] == (len(meta['req_ids']) > sparse_threshold):
+            log.debug('Cache hit: %s', path)
+            return path
+        shutil.rmtree(path, ignore_errors=True)
+    log.debug('Cache miss: %s', path)
+    try:
+        save(path, parse_input(filename, False))
+    except OSError as e:
+        log.warning('Could not write the cache entry for %s: %s', filename, e)
+        return None
+    return path
+
+
+def resolve(source):
+    """
+    :param source: The path of a cache entry, or the parsed input itself
+    :return: The parsed input
+    """
+    return load(source) if isinstance(source, str) else source
@@ -0,0 +1,197 @@
+"""
+    Decomposition of an instance into independent parts, that are solved separately and merged again.
+
+    Requests only interact through the cars they can use: the zones have no capacity, and the cost of a request only
+    depends on the zone of its own car. So the connected components of the request-car compatibility graph are fully
+    independent subproblems, and the best solution of the whole instance is the union of the best solutions of the parts.
+
+    The components are packed into at most `threads` parts (largest first, into the least loaded part), and the workers
+    are divided over the parts in proportion to their amount of requests. Every part is a normal instance, in the same
+    form as parse_input returns, with its own Board. MergedBoard shows those boards as a single board of the whole instance.
+
+    Cars that no request can use are not in any part, they stay unassigned. The course material instances are a single
+    component, so there this changes nothing.
+"""
+import heapq
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from CarSharing.Board import Board
+from CarSharing.Model import Model
+from CarSharing.Request import Request
+from CarSharing.input_parser import calculate
+
+
+class Part:
+    """
+    One part of a decomposed instance.
+    """
+    # np {int -> int}: Global index of every request & car in this part, the part's own index is the position in here.
+    requests: np.ndarray
+    cars: np.ndarray
+    # The part as instance, in the same form as parse_input returns.
+    inp: tuple
+    # Amount of workers for this part
+    workers: int
+
+    def __init__(self, requests: np.ndarray, cars: np.ndarray, inp: tuple, workers: int):
+        self.requests = requests
+        self.cars = cars
+        self.inp = inp
+        self.workers = workers
+
+    def __repr__(self):
+        return 'Part<requests: {}, cars: {}, workers: {}>'.format(len(self.requests), len(self.cars), self.workers)
+
+
+def components(model: Model) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Connected components of the request-car compatibility graph, with a union-find over the cars.
+    :return: (amount of components, request index -> component, car index -> component)
+    """
+    parent = list(range(len(model.car_ids)))
+
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    indptr = model.vehicles_indptr.tolist()
+    vehicles = model.vehicles.tolist()
+    for i in range(len(indptr) - 1):
+        cars = vehicles[indptr[i]:indptr[i + 1]]
+        root = find(cars[0])
+        for car in cars[1:]:
+            other = find(car)
+            if other != root:
+                parent[other] = root
+
+    roots, car_component = np.unique([find(c) for c in range(len(parent))], return_inverse=True)
+    # Every request has at least 1 car, all of its cars are in the same component.
+    req_component = car_component[model.vehicles[model.vehicles_indptr[:-1]]]
+    return len(roots), req_component, car_component
+
+
+def pack(sizes: List[int], bins: int) -> List[List[int]]:
+    """
+    Longest processing time first: every item (largest first) goes into the bin with the smallest total so far.
+    :return: The items per bin, empty bins are left out.
+    """
+    heap = [(0, b) for b in range(bins)]
+    packed = [[] for _ in range(bins)]
+    for item in sorted(range(len(sizes)), key=lambda x: -sizes[x]):
+        total, b = heapq.heappop(heap)
+        packed[b].append(item)
+        heapq.heappush(heap, (total + sizes[item], b))
+    return [items for items in packed if items]
+
+
+def allocate(sizes: List[int], workers: int) -> List[int]:
+    """
+    Divide the workers in proportion to the sizes, with at least 1 each (largest remainder method).
+    There must be at least as many workers as sizes.
+    """
+    spare = workers - len(sizes)
+    total = sum(sizes)
+    shares = [spare * size / total for size in sizes]
+    counts = [1 + int(share) for share in shares]
+    for i in sorted(range(len(sizes)), key=lambda x: int(shares[x]) - shares[x])[:workers - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def subproblem(inp, req_indexes: np.ndarray, car_indexes: np.ndarray) -> tuple:
+    """
+    The instance with only these requests and cars (and all zones), in the same form as parse_input returns.
+    """
+    requests, request_map, zones, zone_map, vehicles, days, overlap, model = inp
+    cars = [vehicles[c] for c in car_indexes.tolist()]
+    part = []
+    for i, r in enumerate(requests[x] for x in req_indexes.tolist()):
+        part.append(Request(r.id, r.zone, r.day, r.start, r.duration, ','.join(r.vehicles), r.penalty1, r.penalty2, i))
+    return part, {req.id: req for req in part}, zones, zone_map, cars, days, calculate(part, False), Model.from_objects(part, zones, cars)
+
+
+def whole(inp, threads: int) -> Part:
+    """
+    The whole instance as a single part.
+    """
+    model = inp[-1]
+    return Part(np.arange(len(model.req_ids)), np.arange(len(model.car_ids)), inp, threads)
+
+
+def split(inp, threads: int) -> List[Part]:
+    """
+    Decompose the instance into at most threads parts.
+    :return: The parts, a single part (the whole instance) if it doesn't fall apart.
+    """
+    model = inp[-1]
+    count, req_component, car_component = components(model)
+    sizes = np.bincount(req_component, minlength=count).tolist()
+    # Components without requests are cars no one can use.
+    groups = pack([size for size in sizes if size], threads)
+    if len(groups) <= 1:
+        return [whole(inp, threads)]
+
+    labels = [c for c, size in enumerate(sizes) if size]
+    parts = []
+    for group, workers in zip(groups, allocate([sum(sizes[labels[x]] for x in group) for group in groups], threads)):
+        members = [labels[x] for x in group]
+        req_indexes = np.flatnonzero(np.isin(req_component, members))
+        car_indexes = np.flatnonzero(np.isin(car_component, members))
+        parts.append(Part(req_indexes, car_indexes, subproblem(inp, req_indexes, car_indexes), workers))
+    return parts
+
+
+class MergedBoard:
+    """
+    The boards of all parts, as a single (read only) board of the whole instance. Empty until every part has a solution.
+    """
+    def __init__(self, model: Model, parts: List[Part], boards: List[Board]):
+        self.model = model
+        self.parts = parts
+        self.boards = boards
+
+    def __repr__(self):
+        return 'MergedBoard<version: {}, cost: {}, parts: {}>'.format(self.version, self.cost, len(self.boards))
+
+    @property
+    def version(self) -> int:
+        """ Changes every time a part has a new best. """
+        versions = [board.version for board in self.boards]
+        return 0 if 0 in versions else sum(versions)
+
+    @property
+    def cost(self) -> Optional[int]:
+        costs = [board.cost for board in self.boards]
+        return None if None in costs else sum(costs)
+
+    def read(self) -> Optional[Tuple[int, int, np.ndarray, np.ndarray]]:
+        """
+        :return: (version, cost, assignment, placement) of the union of the best solutions of the parts, or None if any board is empty.
+        """
+        assignment = self.model.empty_assignment()
+        placement = self.model.empty_placement()
+        version = cost = 0
+        for part, board in zip(self.parts, self.boards):
+            best = board.read()
+            if best is None:
+                return None
+            v, c, part_assignment, part_placement = best
+            version += v
+            cost += c
+            # Part indexes to global indexes
+            assigned = part_assignment >= 0
+            assignment[part.requests[assigned]] = part.cars[part_assignment[assigned]]
+            placement[part.cars] = part_placement
+        return version, cost, assignment, placement
+
+    def close(self):
+        for board in self.boards:
+            board.close()
+
+    def unlink(self):
+        for board in self.boards:
+            board.unlink()
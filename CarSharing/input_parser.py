@@ -1,42 +1,58 @@
-import itertools
+import sys
 from typing import List
 
 import numpy as np
 
+from CarSharing.Model import Model
+from CarSharing.Overlap import Overlap, DenseOverlap, SparseOverlap
+from CarSharing.Problem import get_from_env_or_default
 from CarSharing.Request import Request
-from CarSharing.Zone import Zone
+from CarSharing.Zone import Zone, link
 
 
-def calculate(requests, debug) -> (np.ndarray, np.ndarray):
+# Above this amount of requests, the overlap relation is stored as adjacency lists instead of an n x n matrix.
+sparse_threshold = get_from_env_or_default('OVERLAP_SPARSE_THRESHOLD', 2000)
+
+
+def overlapping_pairs(requests: List[Request]) -> (np.ndarray, np.ndarray):
+    """
+    Sweep line over the requests sorted by real_start.
+    A request overlaps with every later request that starts before (or at the same time as) it ends.
+    Returns 2 arrays of request indexes (i, j), with every overlapping pair in there exactly once.
     """
-    1th return = np array of booleans, where a True indicates an overlap between that row and col's request.
-    ---
-    Calculate the cost of one request vs another, based on the penalty1 (not accept) cost only.
-    Multiply with overlap matrix for easy summing of rows/cols
+    n = len(requests)
+    starts = np.fromiter((r.real_start for r in requests), dtype=np.int64, count=n)
+    ends = np.fromiter((r.real_end for r in requests), dtype=np.int64, count=n)
+
+    order = np.argsort(starts, kind='stable')
+    # For every request (in sorted order), the first position that starts after it ends.
+    stop = np.searchsorted(starts[order], ends[order], side='right')
+    # Amount of later requests that overlap, always >= 0 because a request starts before it ends.
+    counts = stop - np.arange(1, n + 1)
 
-    A high positive sum in a row/col means the row/col's request is important. = 2nd return
+    # Expand the runs [position + 1, stop) into pairs of positions
+    rows = np.repeat(np.arange(n), counts)
+    cols = np.arange(rows.size) - np.repeat(np.cumsum(counts) - counts, counts) + rows + 1
+
+    return order[rows], order[cols]
+
+
+def calculate(requests, debug) -> Overlap:
+    """
+    Returns the overlap relation between the requests. Dense for small instances, sparse above the threshold.
     """
     n = len(requests)
-    overlaps = np.zeros((n, n), dtype=bool)
-    # cost = np.zeros((n, n), dtype=int)
-
-    for (i, request1), (j, request2) in itertools.combinations(enumerate(requests), 2):
-        # cost[i][j] = request1.penalty1 - request2.penalty1
-        # cost[j][i] = request2.penalty1 - request1.penalty1
-
-        if request1.real_start > request2.real_start:
-            request1, request2 = request2, request1  # swap!
-        # Request 1 starts before request 2 starts
-        # If request 1 ends after request 2 starts, it overlaps
-        if request1.real_end >= request2.real_start:
-            overlaps[i][j] = True
-            overlaps[j][i] = True
+    i, j = overlapping_pairs(requests)
+    if n > sparse_threshold:
+        overlaps = SparseOverlap.from_pairs(requests, i, j)
+    else:
+        overlaps = DenseOverlap.from_pairs(requests, i, j)
+
     if debug:
         import png
         with open('overlap.png', 'wb') as f:
             w = png.Writer(n, n, greyscale=True, bitdepth=1)
-            w.write(f, overlaps)
-    # return overlaps, np.sum(cost, axis=1)
+            w.write(f, overlaps.to_dense())
     return overlaps
 
 
@@ -61,13 +77,13 @@ def parse_input(file, debug):
 
                 for x in range(amount):
                     data = map(str.strip, file.readline().split(";"))
-                    zones.append(Zone(*data))
+                    zones.append(Zone(*data, len(zones)))
 
             if "+Vehicles:" in line:
                 amount = int(line.split(" ")[1])
 
                 for x in range(amount):
-                    vehicles.append(file.readline().strip())
+                    vehicles.append(sys.intern(file.readline().strip()))
 
             if "+Days" in line:
                 days = int(line.split(" ")[1])
@@ -79,6 +95,7 @@ def parse_input(file, debug):
 
     for request in requests:
         request.zone = zone_map[request.zone]
+    link(zones)
 
     # return (requests, request_map, zones, zone_map, vehicles, days, *calculate(requests, debug))
-    return requests, request_map, zones, zone_map, vehicles, days, calculate(requests, debug)
+    return requests, request_map, zones, zone_map, vehicles, days, calculate(requests, debug), Model.from_objects(requests, zones, vehicles)
@@ -0,0 +1,157 @@
+"""
+    Tuning of the fixed schedule's Simulated Annealing parameters, with successive halving over a process pool.
+    Replaces sa_parameter_tests/run.sh, with the same parameter grid and the same results.csv.
+
+    Every instance is parsed once (see cache), the pool workers get it when they start. All configurations first get a short
+    budget, only the best 1/eta of them continue with an eta times longer budget, and so on. The last rung gets the
+    full runtime. Within a rung all configurations use the same seed, so they get the same initial solutions.
+    Like run.sh, an evaluation is a single thread doing restarts with a configuration until its budget is used up.
+
+    Output (in the output directory):
+        results.csv     instance,t_max,t_min,alpha,iterations,score: score at the longest budget the config got
+        racing.csv      instance,t_max,t_min,alpha,iterations,rung,budget,score: every evaluation
+
+    Run with `python -m CarSharing.tuning <input_file>... <runtime> [--workers N] [--eta 3] [--min-runtime 1]`
+"""
+import argparse
+import csv
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+from typing import List, Tuple
+
+from CarSharing import cache
+from CarSharing.Problem import Problem
+from CarSharing.Schedule import Schedule
+from CarSharing.input_parser import parse_input
+
+# The grid of run.sh
+T_MAX = (100, 1000, 10000, 100000)
+T_MIN = (1, 10, 100)
+ITERATIONS = (10, 100, 500, 1000, 5000, 10000)
+ALPHA = (0.55, 0.65, 0.75, 0.85, 0.95)
+
+parser = argparse.ArgumentParser(prog='python -m CarSharing.tuning')
+parser.add_argument('input', nargs='+', help='The input files to tune on')
+parser.add_argument('runtime', type=float, help='Budget in seconds of the last rung (the full runtime of run.sh)')
+parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes in the pool')
+parser.add_argument('--eta', type=int, default=3, help='Keep the best 1/eta of the configurations per rung')
+parser.add_argument('--min-runtime', type=float, default=1, help='Minimum budget in seconds of the first rung')
+parser.add_argument('--seed', type=int, default=42, help='A seed for the RNG')
+parser.add_argument('--output', default='.', help='Output directory for results.csv and racing.csv')
+
+# (t_max, t_min, alpha, iterations)
+Config = Tuple[int, int, float, int]
+
+# The parsed instance, in the pool workers.
+_inp = None
+
+
+def configurations() -> List[Config]:
+    """
+    All parameter sets of the grid with a total of 1k to 100k iterations per run.
+    """
+    configs = []
+    for t_max, t_min, iterations, alpha in itertools.product(T_MAX, T_MIN, ITERATIONS, ALPHA):
+        n = math.ceil(math.log(t_min / t_max, alpha)) * iterations
+        if 1000 <= n <= 100000:
+            configs.append((t_max, t_min, alpha, iterations))
+    return configs
+
+
+def budgets(runtime: float, min_runtime: float, eta: int) -> List[float]:
+    """
+    The budgets of the rungs: runtime / eta^k, ..., runtime / eta, runtime, with the first one at least min_runtime.
+    """
+    rungs = max(0, int(math.log(runtime / min_runtime, eta))) if runtime > min_runtime else 0
+    return [runtime / eta ** k for k in range(rungs, -1, -1)]
+
+
+def init_worker(source):
+    global _inp
+    _inp = cache.resolve(source)
+    logging.disable(logging.INFO)
+
+
+def evaluate(args: Tuple[Config, float, int]) -> int:
+    """
+    Restarts with this configuration until the budget is used up.
+    :return: The best cost
+    """
+    config, budget, seed = args
+    rng = random.Random(seed)
+    schedule = Schedule(*config)
+    deadline = time.monotonic() + budget
+    best = None
+    aborted = False
+    while not aborted:
+        problem = Problem(0, random.Random(rng.random()), *_inp)
+        problem.deadline = deadline
+        iterations, aborted = problem.run(False, schedule)
+        if best is None or problem.solution.cost < best:
+            best = problem.solution.cost
+    return best
+
+
+def race(pool, configs: List[Config], budgets: List[float], eta: int, seed: int, log: logging.Logger):
+    """
+    Successive halving.
+    :return: [(config, rung, budget, score)] of every evaluation
+    """
+    evaluations = []
+    for rung, budget in enumerate(budgets):
+        log.info('Rung %d: %d configurations for %.2f s each', rung, len(configs), budget)
+        scores = pool.map(evaluate, [(config, budget, seed + rung) for config in configs], chunksize=1)
+        evaluations.extend((config, rung, budget, score) for config, score in zip(configs, scores))
+        ranked = sorted((score if score is not None else math.inf, config) for config, score in zip(configs, scores))
+        log.info('Rung %d: best %s: %s', rung, ranked[0][1], ranked[0][0])
+        if rung < len(budgets) - 1:
+            configs = [config for score, config in ranked[:max(1, math.ceil(len(ranked) / eta))]]
+    return evaluations
+
+
+def main():
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s %(levelname)s] %(message)s', datefmt='%H:%M:%S', force=True)
+    log = logging.getLogger('tuning')
+
+    configs = configurations()
+    rungs = budgets(args.runtime, args.min_runtime, args.eta)
+    log.info('%d configurations, budgets: %s', len(configs), ', '.join('%.2f' % x for x in rungs))
+
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, 'results.csv'), 'w', newline='') as results_file, \
+            open(os.path.join(args.output, 'racing.csv'), 'w', newline='') as racing_file:
+        results = csv.writer(results_file)
+        racing = csv.writer(racing_file)
+        racing.writerow(('instance', 't_max', 't_min', 'alpha', 'iterations', 'rung', 'budget', 'score'))
+
+        for filename in args.input:
+            instance = os.path.splitext(os.path.basename(filename))[0]
+            log.info('Tuning %s', instance)
+            start = time.perf_counter()
+            # The workers memory map the cache entry, or get a copy of the parsed input if there is none.
+            source = cache.prepare(filename) or parse_input(filename, False)
+            with mp.Pool(args.workers, init_worker, (source,)) as pool:
+                evaluations = race(pool, configs, rungs, args.eta, args.seed, log)
+            cpu = sum(budget for config, rung, budget, score in evaluations)
+            log.info('Tuned %s in %.1f s, %.1f CPU s (run.sh: %.1f CPU s)', instance, time.perf_counter() - start, cpu, len(configs) * args.runtime)
+
+            # Only the evaluation with the longest budget per configuration goes in the results, best first.
+            final = {}
+            for config, rung, budget, score in evaluations:
+                racing.writerow((instance, *config, rung, budget, score))
+                final[config] = (-rung, math.inf if score is None else score)
+            ranked = sorted(final, key=final.get)
+            for config in ranked:
+                results.writerow((instance, *config, final[config][1]))
+            best_config, best_score = ranked[0], final[ranked[0]][1]
+            log.info('Best for %s: T = %d -> %d with α = %g per %d iterations: %s', instance, *best_config, best_score)
+
+
+if __name__ == '__main__':
+    main()
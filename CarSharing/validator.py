@@ -0,0 +1,170 @@
+"""
+    Validator for solution files, as written by Solution.save. Replaces the validator.jar from the course material.
+
+    Reads the solution into the int arrays of the Model (see Solution.encode), then checks it with vectorized numpy:
+        - Every car is in a known zone, exactly once.
+        - Every request is either assigned or unassigned, exactly once.
+        - Requests are only assigned to compatible cars, in their own zone or a neighbouring zone.
+        - Requests on the same car don't overlap.
+        - The reported cost matches the cost of the solution.
+
+    Run with `python -m CarSharing.validator <input_file> <solution_file>`
+"""
+import sys
+from typing import List, Tuple, Optional
+
+import numpy as np
+
+from CarSharing.Model import Model
+
+
+class Report:
+    def __init__(self):
+        self.errors: List[str] = []
+        self.reported_cost: Optional[int] = None
+        self.cost: Optional[int] = None
+
+    def __repr__(self):
+        return 'Report<valid: {}, cost: {}, reported: {}, errors: {}>'.format(self.valid, self.cost, self.reported_cost, len(self.errors))
+
+    def __bool__(self):
+        return self.valid
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    def error(self, message: str, *args):
+        self.errors.append(message % args)
+
+    def lines(self) -> List[str]:
+        if self.valid:
+            return ['Solution is valid, cost: %d' % self.cost]
+        lines = ['Solution is NOT valid, %d error(s):' % len(self.errors)]
+        lines.extend(self.errors)
+        return lines
+
+
+def read_solution(file, model: Model, report: Report) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read a solution file into (assignment, placement) arrays. Problems with the file itself go in the report.
+    Unassigned requests get -2 in the assignment, so requests that are in neither section can be found.
+    """
+    req_index = {req: i for i, req in enumerate(model.req_ids)}
+    zone_index = {zone: i for i, zone in enumerate(model.zone_ids)}
+
+    assignment = np.full(len(model.req_ids), -1, dtype=np.int32)
+    placement = model.empty_placement()
+
+    section = None
+    for line_nr, line in enumerate(file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line_nr == 1:
+            try:
+                report.reported_cost = int(line)
+            except ValueError:
+                report.error('Line 1: Cost is not an integer: %r', line)
+            continue
+        if line.startswith('+'):
+            section = line
+            continue
+
+        data = line.split(';')
+        if section == '+Vehicle assignments':
+            if len(data) != 2 or data[0] not in model.car_index or data[1] not in zone_index:
+                report.error('Line %d: Unknown car or zone: %r', line_nr, line)
+            elif placement[model.car_index[data[0]]] != -1:
+                report.error('Line %d: Car %s is assigned to a zone more than once', line_nr, data[0])
+            else:
+                placement[model.car_index[data[0]]] = zone_index[data[1]]
+        elif section == '+Assigned requests':
+            if len(data) != 2 or data[0] not in req_index or data[1] not in model.car_index:
+                report.error('Line %d: Unknown request or car: %r', line_nr, line)
+            elif assignment[req_index[data[0]]] != -1:
+                report.error('Line %d: Request %s is listed more than once', line_nr, data[0])
+            else:
+                assignment[req_index[data[0]]] = model.car_index[data[1]]
+        elif section == '+Unassigned requests':
+            if data[0] not in req_index:
+                report.error('Line %d: Unknown request: %r', line_nr, line)
+            elif assignment[req_index[data[0]]] != -1:
+                report.error('Line %d: Request %s is listed more than once', line_nr, data[0])
+            else:
+                assignment[req_index[data[0]]] = -2
+        else:
+            report.error('Line %d: Not in a known section: %r', line_nr, line)
+
+    if report.reported_cost is None and not report.errors:
+        report.error('Empty solution file')
+    return assignment, placement
+
+
+def check(model: Model, assignment: np.ndarray, placement: np.ndarray, report: Report):
+    """
+    Check an encoded solution. Unassigned requests can be -1 or -2 in the assignment (-1 means not mentioned at all
+    when coming from read_solution, so that is only an error if the report has a reported_cost).
+    """
+    m = len(model.car_ids)
+
+    for car in np.flatnonzero(placement < 0):
+        report.error('Car %s is not assigned to a zone', model.car_ids[car])
+    if report.reported_cost is not None:
+        for req in np.flatnonzero(assignment == -1):
+            report.error('Request %s is not in the assigned or unassigned requests', model.req_ids[req])
+
+    reqs = np.flatnonzero(assignment >= 0)
+    cars = assignment[reqs]
+
+    # Compatible cars: is (request, car) one of the pairs in the CSR table?
+    compatible_codes = np.repeat(np.arange(len(model.req_ids), dtype=np.int64), np.diff(model.vehicles_indptr)) * m + model.vehicles
+    for i in np.flatnonzero(~np.isin(reqs.astype(np.int64) * m + cars, compatible_codes)):
+        report.error('Request %s is assigned to incompatible car %s', model.req_ids[reqs[i]], model.car_ids[cars[i]])
+
+    # Zones: The car must be in the request's zone or a neighbouring zone.
+    zones = placement[cars]
+    placed = zones >= 0
+    req_zones = model.req_zone[reqs]
+    feasible = ~placed | (zones == req_zones) | model.adjacency[np.maximum(zones, 0), req_zones]
+    for i in np.flatnonzero(~feasible):
+        report.error('Request %s (zone %s) is assigned to car %s in zone %s, which is not the same or a neighbour',
+                     model.req_ids[reqs[i]], model.zone_ids[req_zones[i]], model.car_ids[cars[i]], model.zone_ids[zones[i]])
+
+    # Overlap: Sort per car on start, then every request must start after the previous one on the same car ends.
+    order = np.lexsort((model.req_start[reqs], cars))
+    sorted_reqs = reqs[order]
+    sorted_cars = cars[order]
+    clash = (sorted_cars[1:] == sorted_cars[:-1]) & (model.req_start[sorted_reqs[1:]] <= model.req_end[sorted_reqs[:-1]])
+    for i in np.flatnonzero(clash):
+        report.error('Requests %s and %s overlap on car %s',
+                     model.req_ids[sorted_reqs[i]], model.req_ids[sorted_reqs[i + 1]], model.car_ids[sorted_cars[i]])
+
+    if report.valid:
+        report.cost = model.cost(np.where(assignment >= 0, assignment, -1), placement)
+        if report.reported_cost is not None and report.cost != report.reported_cost:
+            report.error('Reported cost %d does not match the calculated cost %d', report.reported_cost, report.cost)
+
+
+def validate(model: Model, solution_filename: str) -> Report:
+    report = Report()
+    with open(solution_filename) as file:
+        assignment, placement = read_solution(file, model, report)
+    check(model, assignment, placement, report)
+    return report
+
+
+def main():
+    from CarSharing.input_parser import parse_input
+
+    if len(sys.argv) != 3:
+        print('Usage: python -m CarSharing.validator <input_file> <solution_file>', file=sys.stderr)
+        sys.exit(2)
+    model = parse_input(sys.argv[1], False)[-1]
+    report = validate(model, sys.argv[2])
+    print(*report.lines(), sep='\n')
+    sys.exit(0 if report.valid else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+    Benchmark of the overlap construction (input_parser.calculate) against the old pairwise implementation,
+    and the memory use of the dense and sparse representations.
+
+    Run from the repository root with `PYTHONPATH=. python benchmarks/overlap.py [sizes...]`
+"""
+import argparse
+import itertools
+import random
+import time
+
+import numpy as np
+
+from CarSharing.Overlap import DenseOverlap, SparseOverlap
+from CarSharing.Request import Request
+from CarSharing.input_parser import calculate, overlapping_pairs
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('sizes', type=int, nargs='*', default=[100, 360, 1000, 3000, 10000], help='Instance sizes (amount of requests)')
+parser.add_argument('--days', type=int, default=5, help='Amount of days the requests are spread over')
+parser.add_argument('--reference-max', type=int, default=3000, help='Largest size to also run the old implementation on')
+parser.add_argument('--seed', type=int, default=42, help='A seed for the RNG')
+
+
+def calculate_reference(requests) -> np.ndarray:
+    """ The old implementation: a pure Python loop over all pairs. """
+    n = len(requests)
+    overlaps = np.zeros((n, n), dtype=bool)
+    for (i, request1), (j, request2) in itertools.combinations(enumerate(requests), 2):
+        if request1.real_start > request2.real_start:
+            request1, request2 = request2, request1  # swap!
+        if request1.real_end >= request2.real_start:
+            overlaps[i][j] = True
+            overlaps[j][i] = True
+    return overlaps
+
+
+def random_requests(rng: random.Random, n: int, days: int):
+    """ Requests with the same distribution of start times and durations as the course material. """
+    requests = []
+    for i in range(n):
+        # Include some exact edge cases (touching and identical starts), those must count as overlap.
+        start = rng.randrange(0, 24 * 60, 15)
+        duration = rng.randrange(0, 8 * 60, 15)
+        requests.append(Request('req%d' % i, 'z0', rng.randrange(days), start, duration, 'car0', 100, 20, i))
+    return requests
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print('{:>8} {:>12} {:>12} {:>10} {:>8} {:>12} {:>12}'.format('n', 'old (s)', 'new (s)', 'speedup', 'equal', 'dense (MB)', 'sparse (MB)'))
+    for n in args.sizes:
+        requests = random_requests(rng, n, args.days)
+        new_time, new = timed(calculate, requests, False)
+
+        pairs = overlapping_pairs(requests)
+        dense = DenseOverlap.from_pairs(requests, *pairs)
+        sparse = SparseOverlap.from_pairs(requests, *pairs)
+        if not np.array_equal(dense.to_dense(), sparse.to_dense()):
+            raise RuntimeError('Dense and sparse overlap differ for n = %d' % n)
+        memory = '{:>12.2f} {:>12.2f}'.format(dense.nbytes / 1e6, sparse.nbytes / 1e6)
+        del dense, sparse
+
+        if n <= args.reference_max:
+            old_time, old = timed(calculate_reference, requests)
+            equal = np.array_equal(old, new.to_dense())
+            print('{:>8} {:>12.4f} {:>12.4f} {:>9.1f}x {:>8}'.format(n, old_time, new_time, old_time / new_time, str(equal)), memory)
+            if not equal:
+                raise RuntimeError('Overlap matrices differ for n = %d' % n)
+        else:
+            print('{:>8} {:>12} {:>12.4f} {:>10} {:>8}'.format(n, '-', new_time, '-', '-'), memory)
+
+
+if __name__ == '__main__':
+    main()
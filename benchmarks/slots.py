@@ -0,0 +1,134 @@
+"""
+    Memory and attribute access micro-benchmark of the slotted Request/Zone against the old plain classes.
+    Works on CPython and PyPy (PyPy has no tracemalloc, so memory is only reported on CPython).
+
+    Run from the repository root with `PYTHONPATH=. python benchmarks/slots.py [input file]`
+"""
+import argparse
+import gc
+import platform
+import timeit
+
+from CarSharing.Request import Request
+from CarSharing.Zone import Zone
+from CarSharing.input_parser import parse_input
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('input', nargs='?', default='CourseMaterial/360_5_71_25.csv', help='The input file to parse')
+parser.add_argument('--copies', type=int, default=100, help='Amount of copies of every request for the memory test')
+parser.add_argument('--repeat', type=int, default=5, help='Amount of timing repeats, the best one is reported')
+
+
+class OldZone:
+    """ The old Zone: plain class with a set of neighbours. """
+
+    def __init__(self, id: str, neighbours: str):
+        self.id = id
+        self.neighbours = set(neighbours.split(","))
+
+
+class OldRequest:
+    """ The old Request: plain class with a list of vehicles. """
+
+    def __init__(self, id, zone, day, start, duration, vehicles, penalty1, penalty2, index):
+        self.id = id
+        self.zone = zone
+        self.day = int(day)
+        self.start = int(start)
+        self.duration = int(duration)
+        self.vehicles = vehicles.split(",")
+        self.penalty1 = int(penalty1)
+        self.penalty2 = int(penalty2)
+        self.index = index
+        self.real_start = (self.day * 24 * 60) + self.start
+        self.real_end = self.real_start + self.duration
+
+
+def as_rows(requests, zones):
+    """ The input rows again, so both variants can be built from the same data. """
+    request_rows = [(r.id, r.zone.id, r.day, r.start, r.duration, ','.join(r.vehicles), r.penalty1, r.penalty2, r.index) for r in requests]
+    zone_rows = [(z.id, ','.join(z.neighbour_ids)) for z in zones]
+    return request_rows, zone_rows
+
+
+def build_old(request_rows, zone_rows):
+    zones = {row[0]: OldZone(*row) for row in zone_rows}
+    requests = [OldRequest(*row) for row in request_rows]
+    for r in requests:
+        r.zone = zones[r.zone]
+    return requests, list(zones.values())
+
+
+def build_new(request_rows, zone_rows):
+    zones = {row[0]: Zone(*row, i) for i, row in enumerate(zone_rows)}
+    requests = [Request(*row) for row in request_rows]
+    for r in requests:
+        r.zone = zones[r.zone]
+    return requests, list(zones.values())
+
+
+def memory(build, request_rows, zone_rows, copies):
+    """ Bytes allocated per request (including its share of the zones). """
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(request_rows, zone_rows) for _ in range(copies)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / (copies * len(request_rows))
+
+
+def access(requests, zones):
+    """ The attribute accesses of Solution.request_cost and the greedy_assign car loop. """
+    if hasattr(zones[0], 'neighbour_ids'):
+        def neighbours(z): return z.neighbour_ids
+    else:
+        def neighbours(z): return z.neighbours
+    zone_sets = [(zone, neighbours(zone)) for zone in zones]
+
+    def run():
+        total = 0
+        for req in requests:
+            zone_id = req.zone.id
+            for zone, ids in zone_sets:
+                if zone_id in ids:
+                    total += req.penalty2
+            for car in req.vehicles:
+                total += req.index + req.real_start + req.penalty1
+        return total
+    return run
+
+
+def main():
+    args = parser.parse_args()
+    requests, request_map, zones, *_ = parse_input(args.input, False)
+    request_rows, zone_rows = as_rows(requests, zones)
+
+    print('%s %s, %s: %d requests, %d zones' % (platform.python_implementation(), platform.python_version(), args.input, len(requests), len(zones)))
+    print('{:>8} {:>16} {:>20}'.format('', 'bytes / request', 'access (ms / pass)'))
+    results = {}
+    for name, build in (('old', build_old), ('slotted', build_new)):
+        mem = memory(build, request_rows, zone_rows, args.copies)
+        run = access(*build(request_rows, zone_rows))
+        run()  # Warm up (and let the PyPy JIT kick in)
+        best = min(timeit.repeat(run, number=10, repeat=args.repeat)) / 10
+        results[name] = mem, best
+        print('{:>8} {:>16} {:>20.3f}'.format(name, '-' if mem is None else '%.0f' % mem, best * 1000))
+
+    (old_mem, old_time), (new_mem, new_time) = results['old'], results['slotted']
+    if old_mem is not None:
+        print('Memory: %.1f%% of the old size' % (100 * new_mem / old_mem))
+    print('Access: %.2fx speedup' % (old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+    Benchmark suite over the course material instances, with machine-readable results to compare against a baseline.
+
+    Per instance:
+        parse_input, overlap        Parsing the input file, building the overlap relation (s)
+        greedy_assign               Initial solution from scratch (s)
+        priority_assign.<priority>  Initial solution from scratch in priority order, for every priority (s)
+        calculate_cost, copy        Full cost recompute, copy of a solution (s per call)
+        move.<name>                 Every move of Operators on the initial solution, rolled back after every call (s per call)
+                                    The LNS & zones moves get 1/20 of the calls, they are that much slower.
+        iterations_per_second       Fixed seed end-to-end Simulated Annealing runs of --runtime seconds (timed schedule)
+        cost                        Cost reached by those runs
+    Timings are the best of --repeat repeats, so they are as little affected by the rest of the machine as possible.
+    The end-to-end runs depend on timing (schedule & operator selection), so the median of --runs seeds is reported.
+
+    Run from the repository root with `PYTHONPATH=. python benchmarks/suite.py [instances...] [--output new.json] [--compare baseline.json]`
+    With --compare, the exit code is 1 if anything got worse by more than the tolerance.
+"""
+import argparse
+import glob
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import time
+
+from CarSharing.Operators import OPERATORS, LNS_OPERATORS, ZONES_OPERATORS
+from CarSharing.Problem import Problem
+from CarSharing.RandomDict import RandomDict, BiRandomDict
+from CarSharing.Schedule import TimedSchedule
+from CarSharing.Solution import Solution, PRIORITIES
+from CarSharing.input_parser import parse_input, calculate
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('instances', nargs='*', help='Input files, default all CourseMaterial/*_25.csv')
+parser.add_argument('--repeat', type=int, default=5, help='Amount of timing repeats, the best one is reported')
+parser.add_argument('--calls', type=int, default=1000, help='Calls per repeat for the per call timings')
+parser.add_argument('--runtime', type=float, default=5, help='Seconds for the end-to-end runs, 0 to skip them')
+parser.add_argument('--runs', type=int, default=3, help='Amount of end-to-end runs (seeds), the median is reported')
+parser.add_argument('--seed', type=int, default=42, help='A seed for the RNG')
+parser.add_argument('--output', help='Write the results to this JSON file (use it as baseline later)')
+parser.add_argument('--compare', help='Compare against this baseline JSON file')
+parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown before it counts as a regression')
+parser.add_argument('--cost-tolerance', type=float, default=0.05, help='Allowed relative increase of the end-to-end cost')
+
+# Higher is better for these, lower is better for all others.
+HIGHER_IS_BETTER = {'iterations_per_second'}
+
+
+def best_of(repeat: int, func, *args) -> float:
+    """ Best time of a call to func(*args). """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def greedy(problem: Problem) -> Solution:
+    solution = Solution(problem, RandomDict.from_random(problem.rng), BiRandomDict.from_random(problem.rng))
+    solution.greedy_assign()
+    return solution
+
+
+def prioritized(problem: Problem, priority: str) -> Solution:
+    solution = Solution(problem, RandomDict.from_random(problem.rng), BiRandomDict.from_random(problem.rng))
+    solution.priority_assign(priority)
+    return solution
+
+
+def moves(solution: Solution, func, calls: int):
+    for _ in range(calls):
+        solution.begin()
+        func(solution)
+        solution.rollback()
+
+
+def repeated(func, solution: Solution, calls: int):
+    for _ in range(calls):
+        func(solution)
+
+
+def bench_instance(filename: str, args) -> dict:
+    results = {}
+    results['parse_input'] = best_of(args.repeat, parse_input, filename, False)
+    inp = parse_input(filename, False)
+    requests = inp[0]
+    results['overlap'] = best_of(args.repeat, calculate, requests, False)
+
+    problem = Problem(0, random.Random(args.seed), *inp)
+    results['greedy_assign'] = best_of(args.repeat, greedy, problem)
+    for priority in (*PRIORITIES, 'regret'):
+        results['priority_assign.' + priority] = best_of(args.repeat, prioritized, problem, priority)
+
+    problem.rng = random.Random(args.seed)
+    solution = greedy(problem)
+    results['calculate_cost'] = best_of(args.repeat, repeated, Solution.calculate_cost, solution, args.calls) / args.calls
+    results['copy'] = best_of(args.repeat, repeated, Solution.copy, solution, args.calls) / args.calls
+    for operators, calls in ((OPERATORS, args.calls), (LNS_OPERATORS + ZONES_OPERATORS, max(1, args.calls // 20))):
+        for func, weight in operators:
+            problem.rng = random.Random(args.seed)
+            results['move.' + func.__name__] = best_of(args.repeat, moves, solution, func, calls) / calls
+    solution.check_cost()
+
+    if args.runtime > 0:
+        rates = []
+        costs = []
+        for seed in range(args.seed, args.seed + args.runs):
+            problem = Problem(0, random.Random(seed), *inp)
+            start = time.perf_counter()
+            iterations, aborted = problem.run(False, TimedSchedule(time.monotonic() + args.runtime, 1))
+            rates.append(iterations / (time.perf_counter() - start))
+            costs.append(problem.solution.cost)
+        results['iterations_per_second'] = statistics.median(rates)
+        results['cost'] = statistics.median(costs)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, cost_tolerance: float) -> int:
+    """
+    Print the comparison of every result that is also in the baseline.
+    :return: The amount of regressions
+    """
+    regressions = 0
+    print()
+    print('{:<16} {:<28} {:>14} {:>14} {:>9}'.format('instance', 'benchmark', 'baseline', 'new', 'change'))
+    for instance, values in results.items():
+        for name, value in values.items():
+            old = baseline.get(instance, {}).get(name)
+            if old is None or old == 0:
+                continue
+            change = value / old - 1
+            if name in HIGHER_IS_BETTER:
+                worse = change < -tolerance
+            elif name == 'cost':
+                worse = change > cost_tolerance
+            else:
+                worse = change > tolerance
+            regressions += worse
+            print('{:<16} {:<28} {:>14.6g} {:>14.6g} {:>+8.1f}% {}'.format(instance, name, old, value, 100 * change, 'REGRESSION' if worse else ''))
+    return regressions
+
+
+def main():
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    instances = args.instances or sorted(glob.glob('CourseMaterial/*_25.csv'))
+
+    results = {}
+    for filename in instances:
+        name = filename.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        print('Running %s...' % name, file=sys.stderr)
+        results[name] = bench_instance(filename, args)
+
+    names = list(next(iter(results.values())).keys()) if results else []
+    print('{:<28}'.format('benchmark'), *('{:>14}'.format(name) for name in results))
+    for name in names:
+        print('{:<28}'.format(name), *('{:>14.6g}'.format(values.get(name, float('nan'))) for values in results.values()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'python': '%s %s' % (platform.python_implementation(), platform.python_version()),
+                    'machine': platform.platform(),
+                    'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'args': vars(args),
+                },
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.tolerance, args.cost_tolerance)
+        print('%d regression(s) against %s (%s)' % (regressions, args.compare, baseline['meta']['date']))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
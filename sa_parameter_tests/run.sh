@@ -6,6 +6,8 @@
 export DEBUG=True
 export NO_SHOW=True
 export PYTHONPATH=..
+# This is a grid over the parameters of the fixed schedule, the timed one would pick its own alpha.
+export SA_SCHEDULE=fixed
 
 IN_FILE="$1"
 RUNTIME="$2"